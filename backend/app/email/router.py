@@ -1,25 +1,37 @@
-from typing import List, Dict
-from fastapi import APIRouter
+from typing import List, Dict, Optional
+from fastapi import APIRouter, Query, Response
 from starlette import status
-from app.email.schema import EmailAlertsResponse
+from app.email.schema import EmailAlertsResponse, EmailBodyResponse
 from app.email.service import EmailService
-from db import db_dependency
+from db import async_db_dependency
 from auth import get_current_user_dependency
 
 email_router = APIRouter(prefix='/api/email', tags=['email'])
 
 
 @email_router.get('/list', response_model=List[EmailAlertsResponse], status_code=status.HTTP_200_OK)
-def get_email_alerts(user: get_current_user_dependency, db: db_dependency):
+async def get_email_alerts(user: get_current_user_dependency, db: async_db_dependency, response: Response,
+                           limit: int = Query(50, ge=1, le=500), cursor: Optional[str] = None):
     """
-    Retrieve email settings for the authenticated user.
+    Sent alerts newest first. The next page's cursor is returned in the X-Next-Cursor header.
+    """
+    emails, next_cursor = await EmailService.get_email_alerts(user, db, limit, cursor)
+    if next_cursor is not None:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return emails
+
+
+@email_router.get('/body', response_model=EmailBodyResponse, status_code=status.HTTP_200_OK)
+async def get_email_body(email_id: int, user: get_current_user_dependency, db: async_db_dependency):
+    """
+    Subject and rendered HTML body of one sent alert.
     """
-    return EmailService.get_email_alerts(user, db)
+    return await EmailService.get_email_body(email_id, user, db)
 
 
 @email_router.put('/toggle', response_model=Dict, status_code=status.HTTP_201_CREATED)
-def toggle_email_alert(target_id: int, user: get_current_user_dependency, db: db_dependency):
+async def toggle_email_alert(target_id: int, user: get_current_user_dependency, db: async_db_dependency):
     """
     Retrieve email settings for the authenticated user.
     """
-    return EmailService.toggle_email_alert(target_id, user, db)
+    return await EmailService.toggle_email_alert(target_id, user, db)
@@ -6,8 +6,15 @@ from app.target.schema import TargetUrlResponse
 
 
 class EmailAlertsResponse(BaseModel):
+    id: int
     created_at: datetime
     target: TargetUrlResponse
 
     class Config:
         from_attributes = True
+
+
+class EmailBodyResponse(BaseModel):
+    id: int
+    subject: str
+    body: str
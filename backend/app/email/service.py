@@ -1,10 +1,18 @@
+from typing import Optional
+
 from fastapi import HTTPException
+from sqlalchemy import select, tuple_
 from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload, load_only, undefer
 from starlette import status
 
-from app.email.schema import EmailAlertsResponse
+from app.email.schema import EmailAlertsResponse, EmailBodyResponse
 from logger import logger
-from models import PingTarget
+from models import EmailsSent, PingTarget
+from utils.cache import result_cache
+from utils.pagination import decode_cursor, encode_cursor
+from utils.send_email import render_sent
 
 
 class EmailService:
@@ -12,9 +20,10 @@ class EmailService:
         pass
 
     @staticmethod
-    def get_email_alerts(user, db):
+    async def get_email_alerts(user, db: AsyncSession, limit: int = 50, cursor: Optional[str] = None):
         """
-        Retrieve email settings for the authenticated user.
+        Return one page of the user's sent alerts, newest first, and the cursor of the next page
+        (None on the last page). Subjects and bodies are not loaded.
         """
         try:
             if user is None:
@@ -23,28 +32,47 @@ class EmailService:
                     detail="User not authenticated"
                 )
 
-            return [EmailAlertsResponse.model_validate(email) for email in user.emails]
+            query = select(EmailsSent).options(
+                load_only(EmailsSent.id, EmailsSent.created_at, EmailsSent.target_id),
+                joinedload(EmailsSent.target).load_only(PingTarget.id, PingTarget.name, PingTarget.url)
+            ).where(EmailsSent.user_id == user.id)
+
+            if cursor is not None:
+                query = query.where(tuple_(EmailsSent.created_at, EmailsSent.id) < decode_cursor(cursor))
+
+            # One extra row tells whether there is a next page
+            emails = (await db.execute(
+                query.order_by(EmailsSent.created_at.desc(), EmailsSent.id.desc()).limit(limit + 1)
+            )).scalars().all()
+
+            next_cursor = None
+            if len(emails) > limit:
+                emails = emails[:limit]
+                next_cursor = encode_cursor(emails[-1].created_at, emails[-1].id)
+
+            return [EmailAlertsResponse.model_validate(email) for email in emails], next_cursor
+
+        except HTTPException:
+            raise
 
         except SQLAlchemyError as e:
-            print(f"Database error: {str(e)}")
             logger.error(f"Database error: {str(e)}")
-            db.rollback()
+            await db.rollback()
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail=f"Database error occurred: {str(e)}"
             )
 
         except Exception as e:
-            print(f"Database error: {str(e)}")
             logger.error(f"Unexpected error: {str(e)}")
-            db.rollback()
+            await db.rollback()
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail=f"Unexpected error: {str(e)}"
             )
 
     @staticmethod
-    def toggle_email_alert(target_id: int, user, db):
+    async def toggle_email_alert(target_id: int, user, db: AsyncSession):
         try:
             if user is None:
                 raise HTTPException(
@@ -52,7 +80,9 @@ class EmailService:
                     detail="User not authenticated"
                 )
 
-            target = db.query(PingTarget).filter_by(id=target_id, user_id=user.id).first()
+            target = (await db.execute(
+                select(PingTarget).filter_by(id=target_id, user_id=user.id)
+            )).scalars().first()
 
             if not target:
                 raise HTTPException(
@@ -63,25 +93,80 @@ class EmailService:
             # Toggle the email alert setting
             target.send_email = not target.send_email
 
-            db.commit()
+            await db.commit()
+            await result_cache.invalidate(user.id)
 
             return {
                 "message": f"Email alert for target {target_id} {'enabled' if target.send_email else 'disabled'} successfully."
             }
 
         except SQLAlchemyError as e:
-            print(f"Database error: {str(e)}")
             logger.error(f"Database error: {str(e)}")
-            db.rollback()
+            await db.rollback()
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=f"Database error occurred: {str(e)}"
+            )
+
+        except Exception as e:
+            logger.error(f"Unexpected error: {str(e)}")
+            await db.rollback()
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=f"Unexpected error: {str(e)}"
+            )
+
+    @staticmethod
+    async def get_email_body(email_id: int, user, db: AsyncSession):
+        """
+        Render the body of one sent alert or digest from its template and stored values.
+        """
+        try:
+            if user is None:
+                raise HTTPException(
+                    status_code=status.HTTP_401_UNAUTHORIZED,
+                    detail="User not authenticated"
+                )
+
+            email = (await db.execute(
+                select(EmailsSent).options(undefer(EmailsSent.params), undefer(EmailsSent.body))
+                .filter_by(id=email_id, user_id=user.id)
+            )).scalars().first()
+
+            if not email:
+                raise HTTPException(
+                    status_code=status.HTTP_404_NOT_FOUND,
+                    detail="Email not found"
+                )
+
+            if email.template_id is None:
+                body = email.body
+            elif email.digest_id is None:
+                body = render_sent(email.template_id, [email.params])
+            else:
+                params = (await db.execute(
+                    select(EmailsSent.params)
+                    .filter_by(user_id=user.id, digest_id=email.digest_id)
+                    .order_by(EmailsSent.id)
+                )).scalars().all()
+                body = render_sent(email.template_id, params)
+
+            return EmailBodyResponse(id=email.id, subject=email.subject, body=body)
+
+        except HTTPException:
+            raise
+
+        except SQLAlchemyError as e:
+            logger.error(f"Database error: {str(e)}")
+            await db.rollback()
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail=f"Database error occurred: {str(e)}"
             )
 
         except Exception as e:
-            print(f"Database error: {str(e)}")
             logger.error(f"Unexpected error: {str(e)}")
-            db.rollback()
+            await db.rollback()
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail=f"Unexpected error: {str(e)}"
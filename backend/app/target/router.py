@@ -1,41 +1,65 @@
-from typing import Dict, List
+from datetime import datetime
+from typing import Dict, List, Optional
 
-from fastapi import APIRouter
+from fastapi import APIRouter, Query, Response
+from fastapi.responses import StreamingResponse
 from starlette import status
 
-from app.target.schema import CreateTarget, TargetListResponse, TargetLogsResponse
+from app.target.schema import CreateTarget, TargetLatencyResponse, TargetListResponse, TargetLogsResponse
 from app.target.service import TargetService
-from db import db_dependency
+from db import async_db_dependency
 from auth import get_current_user_dependency
 
 target_router = APIRouter(prefix='/api/target', tags=['target'])
 
 
 @target_router.post("/create", response_model=Dict, status_code=status.HTTP_201_CREATED)
-def create_target(details: CreateTarget, user: get_current_user_dependency, db: db_dependency):
-    return TargetService.create_target(details, user, db)
+async def create_target(details: CreateTarget, user: get_current_user_dependency, db: async_db_dependency):
+    return await TargetService.create_target(details, user, db)
 
 
 @target_router.get("/list", response_model=List[TargetListResponse], status_code=status.HTTP_200_OK)
-def list_targets(user: get_current_user_dependency, db: db_dependency):
-    return TargetService.list_targets(user, db)
+async def list_targets(user: get_current_user_dependency, db: async_db_dependency, hours: int = Query(24, ge=1, le=720)):
+    return await TargetService.list_targets(user, db, hours)
 
 
 @target_router.get("/dashboard-stats", response_model=Dict, status_code=status.HTTP_200_OK)
-def dashboard_stats(user: get_current_user_dependency, db: db_dependency):
-    return TargetService.dashboard_stats(user, db)
+async def dashboard_stats(user: get_current_user_dependency, db: async_db_dependency, hours: int = Query(24, ge=1, le=720)):
+    return await TargetService.dashboard_stats(user, db, hours)
+
+
+@target_router.get("/latency", response_model=TargetLatencyResponse, status_code=status.HTTP_200_OK)
+async def target_latency(target_id: int, user: get_current_user_dependency, db: async_db_dependency,
+                         hours: int = Query(24, ge=1, le=720)):
+    """
+    p50/p90/p99 response time of a target over the last `hours`.
+    """
+    return await TargetService.target_latency(target_id, user, db, hours)
 
 
 @target_router.put("/toggle", response_model=Dict, status_code=status.HTTP_201_CREATED)
-def toggle_target_activity(target_id: int, user: get_current_user_dependency, db: db_dependency):
-    return TargetService.toggle_target_activity(target_id, user, db)
+async def toggle_target_activity(target_id: int, user: get_current_user_dependency, db: async_db_dependency):
+    return await TargetService.toggle_target_activity(target_id, user, db)
 
 
 @target_router.delete("/delete", response_model=Dict, status_code=status.HTTP_201_CREATED)
-def delete_target(target_id: int, user: get_current_user_dependency, db: db_dependency):
-    return TargetService.delete_target(target_id, user, db)
+async def delete_target(target_id: int, user: get_current_user_dependency, db: async_db_dependency):
+    return await TargetService.delete_target(target_id, user, db)
 
 
 @target_router.post("/logs", response_model=List[TargetLogsResponse], status_code=status.HTTP_200_OK)
-def get_target_logs(target_ids: List[int], user: get_current_user_dependency, db: db_dependency):
-    return TargetService.get_target_logs(target_ids, user, db)
+async def get_target_logs(target_ids: List[int], user: get_current_user_dependency, db: async_db_dependency, response: Response,
+                          start: Optional[datetime] = Query(None, alias="from"), end: Optional[datetime] = Query(None, alias="to"),
+                          limit: int = Query(1000, ge=1, le=10000), cursor: Optional[str] = None, stream: bool = False):
+    """
+    Logs newest first. Pages are limited to `limit` rows and the next page's cursor is returned
+    in the X-Next-Cursor header; with `stream=true` every matching log is streamed as NDJSON instead.
+    """
+    if stream:
+        return StreamingResponse(await TargetService.stream_target_logs(target_ids, user, db, start, end, cursor),
+                                 media_type="application/x-ndjson")
+
+    logs, next_cursor = await TargetService.get_target_logs(target_ids, user, db, start, end, limit, cursor)
+    if next_cursor is not None:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return logs
@@ -1,13 +1,23 @@
 from datetime import datetime
-from typing import Dict
+from typing import Dict, Optional
 
-from pydantic import BaseModel
+from pydantic import BaseModel, Field, model_validator
+
+from models import MIN_INTERVAL_SECONDS
 
 
 class CreateTarget(BaseModel):
     name: str
     url: str
     send_email: bool
+    interval_seconds: int = Field(default=900, ge=MIN_INTERVAL_SECONDS, le=86400)
+    jitter_seconds: int = Field(default=0, ge=0)
+
+    @model_validator(mode="after")
+    def jitter_below_interval(self):
+        if self.jitter_seconds >= self.interval_seconds:
+            raise ValueError("Jitter must be smaller than the check interval")
+        return self
 
 
 class TargetUrlResponse(BaseModel):
@@ -26,6 +36,8 @@ class TargetListResponse(BaseModel):
     send_email: bool
     is_down: bool
     is_active: bool
+    interval_seconds: int
+    jitter_seconds: int
     uptime_info: Dict
 
     class Config:
@@ -37,7 +49,20 @@ class TargetLogsResponse(BaseModel):
     target: TargetUrlResponse
     status_code: int
     response_time: int
+    dns_time: Optional[int] = None
+    connect_time: Optional[int] = None
+    tls_time: Optional[int] = None
+    ttfb_time: Optional[int] = None
     created_at: datetime
 
     class Config:
         from_attributes = True
+
+
+class TargetLatencyResponse(BaseModel):
+    target_id: int
+    period_hours: int
+    total_checks: int
+    p50: Optional[float]
+    p90: Optional[float]
+    p99: Optional[float]
@@ -1,17 +1,30 @@
-from datetime import datetime, timedelta
-from typing import List
+from datetime import datetime, timedelta, timezone
+from typing import AsyncIterator, Dict, List, Optional
 from urllib.parse import urlparse
 
-from sqlalchemy import and_
+from sqlalchemy import case, func, select, tuple_, union_all
 
 from fastapi import HTTPException
 from sqlalchemy.exc import SQLAlchemyError, IntegrityError
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from starlette import status
 
-from app.target.schema import CreateTarget, TargetListResponse, TargetLogsResponse
+from app.target.schema import CreateTarget, TargetLatencyResponse, TargetListResponse, TargetLogsResponse, TargetUrlResponse
+from db import AsyncSessionLocal
 from logger import logger
-from models import User, PingTarget, PingLogs
+from models import User, PingTarget, PingLogs, PingLatencyHourly, PingRollupDaily, PingRollupHourly
+from utils.cache import result_cache
+from utils.ddsketch import DDSketch
+from utils.pagination import decode_cursor, encode_cursor
+from utils.rollups import day_bucket, hour_bucket, success_condition
+
+LOGS_STREAM_BATCH = 1000
+
+
+def to_naive_utc(moment: datetime) -> datetime:
+    if moment.tzinfo is None:
+        return moment
+    return moment.astimezone(timezone.utc).replace(tzinfo=None)
 
 
 class TargetService:
@@ -19,7 +32,7 @@ class TargetService:
         pass
 
     @staticmethod
-    def create_target(details: CreateTarget, user: User, db: Session):
+    async def create_target(details: CreateTarget, user: User, db: AsyncSession):
         try:
             if user is None:
                 raise HTTPException(
@@ -36,8 +49,9 @@ class TargetService:
                 )
 
                 db.add(target)
-                db.commit()
-                db.refresh(target)
+                await db.commit()
+                await db.refresh(target)
+                await result_cache.invalidate(user.id)
 
                 return {
                     "message": f"Target created successfully: {target.id}"
@@ -49,8 +63,11 @@ class TargetService:
                     detail="Invalid URL format. Must start with http:// or https:// and must not be localhost url"
                 )
 
+        except HTTPException:
+            raise
+
         except IntegrityError as e:
-            db.rollback()
+            await db.rollback()
             error_str = str(e.orig).lower()
             if 'uq_user_url' in error_str or 'unique constraint' in error_str:
                 logger.error(f"Duplicate URL error for user {user.id}: {details.url}")
@@ -66,53 +83,29 @@ class TargetService:
                 )
 
         except SQLAlchemyError as e:
-            print(f"Database error: {e}")
             logger.error(f"Database error: {str(e)}")
-            db.rollback()
+            await db.rollback()
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail=f"Database error occurred: {str(e)}"
             )
 
         except Exception as e:
-            print(f"Unexpected error: {e}")
-            print(f"Error type: {type(e)}")
-            logger.error(f"Unexpected error: {str(e)}")
+            logger.error(f"Unexpected error ({type(e).__name__}): {str(e)}")
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail=f"Unexpected error: {str(e)}"
             )
 
     @staticmethod
-    def uptime_calculator(target: PingTarget, hours: int = 24, db: Session = None) -> dict:
-        """
-        Calculate uptime percentage for a target over specified days
-
-        Args:
-            target: PingTarget instance
-            days: Number of days to calculate uptime for (default: 30)
-            db: Database session
-
-        Returns:
-            dict: Contains uptime_percentage, total_checks, successful_checks, downtime_minutes
-        """
-        if not db:
-            raise ValueError("Database session is required")
-
-        # Calculate the time window
-        end_time = datetime.utcnow()
-        start_time = end_time - timedelta(hours=hours)
-
-        # Get all ping logs for the target within the time window
-        ping_logs = db.query(PingLogs).filter(
-            and_(
-                PingLogs.target_id == target.id,
-                PingLogs.created_at >= start_time,
-                PingLogs.created_at <= end_time
-            )
-        ).order_by(PingLogs.created_at).all()
+    async def _user_targets(user: User, db: AsyncSession) -> List[PingTarget]:
+        return (await db.execute(
+            select(PingTarget).where(PingTarget.user_id == user.id).order_by(PingTarget.id)
+        )).scalars().all()
 
-        if not ping_logs:
+    @staticmethod
+    def _uptime_info(total_checks: int, successful_checks: int, hours: int) -> dict:
+        if not total_checks:
             return {
                 "uptime_percentage": 0.0,
                 "total_checks": 0,
@@ -120,25 +113,7 @@ class TargetService:
                 "period_hours": hours
             }
 
-        total_checks = len(ping_logs)
-        successful_checks = 0
-        downtime_minutes = 0
-
-        # Count successful pings and calculate downtime
-        for i, log in enumerate(ping_logs):
-            # Consider successful if status code is 2xx or 3xx and response time is reasonable
-            is_successful = (
-                    200 <= log.status_code < 400 and
-                    log.response_time < 30000  # 30 seconds timeout
-            )
-
-            if is_successful:
-                successful_checks += 1
-            else:
-                # Add 30 minutes of downtime for each failed ping
-                downtime_minutes += 30
-
-        uptime_percentage = (successful_checks / total_checks) * 100 if total_checks > 0 else 0
+        uptime_percentage = (successful_checks / total_checks) * 100
 
         return {
             "uptime_percentage": round(uptime_percentage, 2),
@@ -148,7 +123,108 @@ class TargetService:
         }
 
     @staticmethod
-    def list_targets(user: User, db: Session):
+    async def uptime_for_targets(db: AsyncSession, hours: int, *criteria) -> Dict[int, dict]:
+        """
+        Calculate uptime for every target matching `criteria` in a single grouped query
+
+        The window is split into whole days read from the daily rollups (windows over 48 hours
+        only), whole hours read from the hourly rollups, and the leading partial hour counted
+        from the raw ping logs with the success rule applied in SQL. The parts are combined
+        with UNION ALL and summed per target, so the window is exact and the work depends on
+        the number of buckets rather than the number of ping logs.
+
+        Args:
+            db: Database session
+            hours: Number of hours to calculate uptime for
+            criteria: Filters on PingTarget selecting the targets, e.g. PingTarget.user_id == user.id
+
+        Returns:
+            dict: Maps target id to uptime_percentage, total_checks, successful_checks, period_hours
+        """
+        start_time = datetime.utcnow() - timedelta(hours=hours)
+        first_hour = hour_bucket(start_time)
+        if first_hour < start_time:
+            first_hour += timedelta(hours=1)
+
+        segments = [
+            select(
+                PingLogs.target_id.label("target_id"),
+                func.count(PingLogs.id).label("total_checks"),
+                func.sum(case((success_condition(PingLogs.status_code, PingLogs.response_time), 1),
+                              else_=0)).label("successful_checks")
+            ).join(PingTarget, PingTarget.id == PingLogs.target_id).where(
+                *criteria,
+                PingLogs.created_at >= start_time,
+                PingLogs.created_at < first_hour
+            ).group_by(PingLogs.target_id)
+        ]
+
+        hourly_end = None
+        if hours > 48:
+            hourly_end = day_bucket(first_hour)
+            if hourly_end < first_hour:
+                hourly_end += timedelta(days=1)
+
+            segments.append(
+                select(
+                    PingRollupDaily.target_id,
+                    func.sum(PingRollupDaily.total_checks),
+                    func.sum(PingRollupDaily.successful_checks)
+                ).join(PingTarget, PingTarget.id == PingRollupDaily.target_id).where(
+                    *criteria,
+                    PingRollupDaily.bucket_start >= hourly_end
+                ).group_by(PingRollupDaily.target_id)
+            )
+
+        hourly_window = [PingRollupHourly.bucket_start >= first_hour]
+        if hourly_end is not None:
+            hourly_window.append(PingRollupHourly.bucket_start < hourly_end)
+        segments.append(
+            select(
+                PingRollupHourly.target_id,
+                func.sum(PingRollupHourly.total_checks),
+                func.sum(PingRollupHourly.successful_checks)
+            ).join(PingTarget, PingTarget.id == PingRollupHourly.target_id).where(
+                *criteria,
+                *hourly_window
+            ).group_by(PingRollupHourly.target_id)
+        )
+
+        counts = union_all(*segments).subquery()
+        rows = (await db.execute(
+            select(
+                counts.c.target_id,
+                func.sum(counts.c.total_checks),
+                func.sum(counts.c.successful_checks)
+            ).group_by(counts.c.target_id)
+        )).all()
+
+        return {
+            target_id: TargetService._uptime_info(int(total_checks), int(successful_checks), hours)
+            for target_id, total_checks, successful_checks in rows
+        }
+
+    @staticmethod
+    async def uptime_calculator(target: PingTarget, hours: int = 24, db: AsyncSession = None) -> dict:
+        """
+        Calculate uptime percentage for a target over specified hours
+
+        Args:
+            target: PingTarget instance
+            hours: Number of hours to calculate uptime for (default: 24)
+            db: Database session
+
+        Returns:
+            dict: Contains uptime_percentage, total_checks, successful_checks, period_hours
+        """
+        if not db:
+            raise ValueError("Database session is required")
+
+        uptime = await TargetService.uptime_for_targets(db, hours, PingTarget.id == target.id)
+        return uptime.get(target.id) or TargetService._uptime_info(0, 0, hours)
+
+    @staticmethod
+    async def list_targets(user: User, db: AsyncSession, hours: int = 24):
         try:
             if user is None:
                 raise HTTPException(
@@ -156,44 +232,44 @@ class TargetService:
                     detail="User not authenticated"
                 )
 
-            if not user.targets:
-                return []
+            cached, version = await result_cache.get(user.id, "list_targets", hours)
+            if cached is not None:
+                return cached
 
-            targets_with_uptime = []
+            targets = await TargetService._user_targets(user, db)
 
-            for target in user.targets:
-                # Calculate uptime for each target
-                uptime_info = TargetService.uptime_calculator(target=target, hours=24, db=db)
+            uptime = await TargetService.uptime_for_targets(db, hours, PingTarget.user_id == user.id) if targets else {}
 
+            targets_with_uptime = []
+
+            for target in targets:
                 # Create target response with uptime info
                 target_data = target.__dict__.copy()  # Get target attributes
-                target_data['uptime_info'] = uptime_info
+                target_data['uptime_info'] = uptime.get(target.id) or TargetService._uptime_info(0, 0, hours)
 
                 target_response = TargetListResponse.model_validate(target_data)
-                targets_with_uptime.append(target_response)
+                targets_with_uptime.append(target_response.model_dump(mode="json"))
 
-            return [TargetListResponse.model_validate(target) for target in targets_with_uptime]
+            await result_cache.set(user.id, "list_targets", hours, value=targets_with_uptime, version=version)
+            return targets_with_uptime
 
         except SQLAlchemyError as e:
-            print(f"Database error: {e}")
             logger.error(f"Database error: {str(e)}")
-            db.rollback()
+            await db.rollback()
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail=f"Database error occurred: {str(e)}"
             )
 
         except Exception as e:
-            print(f"Unexpected error: {e}")
-            print(f"Error type: {type(e)}")
-            logger.error(f"Unexpected error: {str(e)}")
+            logger.error(f"Unexpected error ({type(e).__name__}): {str(e)}")
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail=f"Unexpected error: {str(e)}"
             )
 
     @staticmethod
-    def dashboard_stats(user: User, db: Session):
+    async def dashboard_stats(user: User, db: AsyncSession, hours: int = 24):
         try:
 
             if user is None:
@@ -202,49 +278,52 @@ class TargetService:
                     detail="User not authenticated"
                 )
 
-            up_count = 0
-            total_uptime = 0.0
-            counted_targets = 0
+            cached, version = await result_cache.get(user.id, "dashboard_stats", hours)
+            if cached is not None:
+                return cached
 
-            for target in user.targets:
-                if target.is_down is False:
-                    up_count = up_count + 1
+            targets = await TargetService._user_targets(user, db)
+            up_count = sum(1 for target in targets if target.is_down is False)
 
-                uptime_info = TargetService.uptime_calculator(target=target, hours=24, db=db)
+            uptime = await TargetService.uptime_for_targets(db, hours, PingTarget.user_id == user.id)
+            counted = [info["uptime_percentage"] for info in uptime.values() if info["total_checks"] > 0]
 
-                if uptime_info["total_checks"] > 0:
-                    total_uptime += uptime_info["uptime_percentage"]
-                    counted_targets += 1
+            average_uptime = (sum(counted) / len(counted)) if counted else 0.0
 
-            average_uptime = (total_uptime / counted_targets) if counted_targets > 0 else 0.0
-
-            return {
-                "total_endpoints": len(user.targets),
+            stats = {
+                "total_endpoints": len(targets),
                 "up_count": up_count,
                 "average_uptime_percentage": round(average_uptime, 2)
             }
 
+            await result_cache.set(user.id, "dashboard_stats", hours, value=stats, version=version)
+            return stats
+
 
         except SQLAlchemyError as e:
-            print(f"Database error: {e}")
             logger.error(f"Database error: {str(e)}")
-            db.rollback()
+            await db.rollback()
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail=f"Database error occurred: {str(e)}"
             )
 
         except Exception as e:
-            print(f"Unexpected error: {e}")
-            print(f"Error type: {type(e)}")
-            logger.error(f"Unexpected error: {str(e)}")
+            logger.error(f"Unexpected error ({type(e).__name__}): {str(e)}")
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail=f"Unexpected error: {str(e)}"
             )
 
     @staticmethod
-    def toggle_target_activity(target_id: int, user: User, db: Session):
+    async def target_latency(target_id: int, user: User, db: AsyncSession, hours: int = 24):
+        """
+        Response-time percentiles of a target over the last `hours`, from its hourly latency sketches.
+
+        The sketches of the window are merged, so the cost depends on the number of hours and not
+        on the number of ping logs. The window starts at the beginning of its first hour and every
+        percentile is within 1% of the exact value.
+        """
         try:
             if user is None:
                 raise HTTPException(
@@ -252,10 +331,70 @@ class TargetService:
                     detail="User not authenticated"
                 )
 
-            target = db.query(PingTarget).filter(
+            target = (await db.execute(select(PingTarget.id).where(
                 PingTarget.id == target_id,
                 PingTarget.user_id == user.id
-            ).first()
+            ))).first()
+
+            if not target:
+                raise HTTPException(
+                    status_code=status.HTTP_404_NOT_FOUND,
+                    detail="Target not found"
+                )
+
+            sketches = (await db.execute(select(PingLatencyHourly.sketch).where(
+                PingLatencyHourly.target_id == target_id,
+                PingLatencyHourly.bucket_start >= hour_bucket(datetime.utcnow() - timedelta(hours=hours))
+            ))).scalars().all()
+
+            sketch = DDSketch()
+            for data in sketches:
+                sketch.merge(DDSketch.from_bytes(data))
+
+            def percentile(q):
+                value = sketch.quantile(q)
+                return round(value, 1) if value is not None else None
+
+            return TargetLatencyResponse(
+                target_id=target_id,
+                period_hours=hours,
+                total_checks=sketch.count,
+                p50=percentile(0.5),
+                p90=percentile(0.9),
+                p99=percentile(0.99)
+            )
+
+        except HTTPException:
+            raise
+
+        except SQLAlchemyError as e:
+            logger.error(f"Database error: {str(e)}")
+            await db.rollback()
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=f"Database error occurred: {str(e)}"
+            )
+
+        except Exception as e:
+            logger.error(f"Unexpected error ({type(e).__name__}): {str(e)}")
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=f"Unexpected error: {str(e)}"
+            )
+
+    @staticmethod
+    async def toggle_target_activity(target_id: int, user: User, db: AsyncSession):
+        try:
+            if user is None:
+                raise HTTPException(
+                    status_code=status.HTTP_401_UNAUTHORIZED,
+                    detail="User not authenticated"
+                )
+
+            target = (await db.execute(select(PingTarget).where(
+                PingTarget.id == target_id,
+                PingTarget.user_id == user.id
+            ))).scalars().first()
 
             if not target:
                 raise HTTPException(
@@ -266,33 +405,31 @@ class TargetService:
             # Toggle the is_active state
             target.is_active = not target.is_active
 
-            db.commit()
-            db.refresh(target)
+            await db.commit()
+            await result_cache.invalidate(user.id)
+            await db.refresh(target)
 
             return {
                 "message": f"Target {target_id} {'activated' if target.is_active else 'deactivated'} successfully"
             }
 
         except SQLAlchemyError as e:
-            print(f"Database error: {e}")
             logger.error(f"Database error: {str(e)}")
-            db.rollback()
+            await db.rollback()
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail=f"Database error occurred: {str(e)}"
             )
 
         except Exception as e:
-            print(f"Unexpected error: {e}")
-            print(f"Error type: {type(e)}")
-            logger.error(f"Unexpected error: {str(e)}")
+            logger.error(f"Unexpected error ({type(e).__name__}): {str(e)}")
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail=f"Unexpected error: {str(e)}"
             )
 
     @staticmethod
-    def delete_target(target_id: int, user: User, db: Session):
+    async def delete_target(target_id: int, user: User, db: AsyncSession):
         try:
             if user is None:
                 raise HTTPException(
@@ -300,10 +437,10 @@ class TargetService:
                     detail="User not authenticated"
                 )
 
-            target = db.query(PingTarget).filter(
+            target = (await db.execute(select(PingTarget).where(
                 PingTarget.id == target_id,
                 PingTarget.user_id == user.id
-            ).first()
+            ))).scalars().first()
 
             if not target:
                 raise HTTPException(
@@ -311,33 +448,84 @@ class TargetService:
                     detail="Target not found"
                 )
 
-            db.delete(target)
-            db.commit()
+            await db.delete(target)
+            await db.commit()
+            await result_cache.invalidate(user.id)
 
             return {
                 "message": f"Target {target_id} deleted successfully"
             }
 
         except SQLAlchemyError as e:
-            print(f"Database error: {e}")
             logger.error(f"Database error: {str(e)}")
-            db.rollback()
+            await db.rollback()
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail=f"Database error occurred: {str(e)}"
             )
 
         except Exception as e:
-            print(f"Unexpected error: {e}")
-            print(f"Error type: {type(e)}")
-            logger.error(f"Unexpected error: {str(e)}")
+            logger.error(f"Unexpected error ({type(e).__name__}): {str(e)}")
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail=f"Unexpected error: {str(e)}"
             )
 
     @staticmethod
-    def get_target_logs(target_ids: List[int], user: User, db: Session):
+    def _target_logs_query(target_ids: List[int], user: User, start: Optional[datetime], end: Optional[datetime],
+                           cursor: Optional[str]):
+        """
+        Logs of the user's requested targets, newest first, ordered by (created_at, id) for keyset pagination
+        """
+        query = select(
+            PingLogs.id,
+            PingLogs.status_code,
+            PingLogs.response_time,
+            PingLogs.created_at,
+            PingTarget.id,
+            PingTarget.name,
+            PingTarget.url,
+            PingLogs.dns_time,
+            PingLogs.connect_time,
+            PingLogs.tls_time,
+            PingLogs.ttfb_time
+        ).join(PingTarget, PingTarget.id == PingLogs.target_id).where(
+            PingLogs.target_id.in_(target_ids),
+            PingTarget.user_id == user.id
+        )
+
+        # created_at is stored as naive UTC
+        if start is not None:
+            query = query.where(PingLogs.created_at >= to_naive_utc(start))
+        if end is not None:
+            query = query.where(PingLogs.created_at < to_naive_utc(end))
+        if cursor is not None:
+            query = query.where(tuple_(PingLogs.created_at, PingLogs.id) < decode_cursor(cursor))
+
+        return query.order_by(PingLogs.created_at.desc(), PingLogs.id.desc())
+
+    @staticmethod
+    def _log_response(row) -> TargetLogsResponse:
+        (log_id, status_code, response_time, created_at, target_id, target_name, target_url,
+         dns_time, connect_time, tls_time, ttfb_time) = row
+        return TargetLogsResponse(
+            id=log_id,
+            target=TargetUrlResponse(id=target_id, name=target_name, url=target_url),
+            status_code=status_code,
+            response_time=response_time,
+            dns_time=dns_time,
+            connect_time=connect_time,
+            tls_time=tls_time,
+            ttfb_time=ttfb_time,
+            created_at=created_at
+        )
+
+    @staticmethod
+    async def get_target_logs(target_ids: List[int], user: User, db: AsyncSession, start: Optional[datetime] = None,
+                        end: Optional[datetime] = None, limit: int = 1000, cursor: Optional[str] = None):
+        """
+        Return one page of logs and the cursor of the next page (None on the last page)
+        """
         try:
             if user is None:
                 raise HTTPException(
@@ -345,37 +533,89 @@ class TargetService:
                     detail="User not authenticated"
                 )
 
-            targets = db.query(PingTarget).filter(
-                PingTarget.id.in_(target_ids),
-                PingTarget.user_id == user.id
-            ).all()
+            await TargetService._check_targets_owned(target_ids, user, db)
 
-            if not targets:
-                raise HTTPException(
-                    status_code=status.HTTP_404_NOT_FOUND,
-                    detail="No targets found"
-                )
+            query = TargetService._target_logs_query(target_ids, user, start, end, cursor)
+            rows = (await db.execute(query.limit(limit + 1))).all()
 
-            logs = []
-            for target in targets:
-                logs.extend(target.logs)
+            next_cursor = None
+            if len(rows) > limit:
+                rows = rows[:limit]
+                next_cursor = encode_cursor(rows[-1][3], rows[-1][0])
+
+            return [TargetService._log_response(row) for row in rows], next_cursor
 
-            return [TargetLogsResponse.model_validate(log) for log in logs]
+        except HTTPException:
+            raise
 
         except SQLAlchemyError as e:
-            print(f"Database error: {e}")
             logger.error(f"Database error: {str(e)}")
-            db.rollback()
+            await db.rollback()
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail=f"Database error occurred: {str(e)}"
             )
 
         except Exception as e:
-            print(f"Unexpected error: {e}")
-            print(f"Error type: {type(e)}")
-            logger.error(f"Unexpected error: {str(e)}")
+            logger.error(f"Unexpected error ({type(e).__name__}): {str(e)}")
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail=f"Unexpected error: {str(e)}"
             )
+
+    @staticmethod
+    async def _check_targets_owned(target_ids: List[int], user: User, db: AsyncSession):
+        """
+        Raise 404 unless at least one of the targets belongs to the user
+        """
+        targets = (await db.execute(select(PingTarget.id).where(
+            PingTarget.id.in_(target_ids),
+            PingTarget.user_id == user.id
+        ))).first()
+
+        if not targets:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="No targets found"
+            )
+
+    @staticmethod
+    async def stream_target_logs(target_ids: List[int], user: User, db: AsyncSession, start: Optional[datetime] = None,
+                                 end: Optional[datetime] = None, cursor: Optional[str] = None) -> AsyncIterator[str]:
+        """
+        Check ownership like page mode, then return a generator yielding the logs as NDJSON lines,
+        read through a server-side cursor in batches of LOGS_STREAM_BATCH rows
+
+        The generator runs on its own session because the request session is closed before the
+        response body is sent.
+        """
+        if user is None:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="User not authenticated"
+            )
+
+        try:
+            await TargetService._check_targets_owned(target_ids, user, db)
+
+        except SQLAlchemyError as e:
+            logger.error(f"Database error: {str(e)}")
+            await db.rollback()
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=f"Database error occurred: {str(e)}"
+            )
+
+        query = TargetService._target_logs_query(target_ids, user, start, end, cursor)
+
+        async def generate():
+            async with AsyncSessionLocal() as db:
+                try:
+                    result = await db.stream(query.execution_options(yield_per=LOGS_STREAM_BATCH))
+                    async for row in result:
+                        yield TargetService._log_response(row).model_dump_json() + "\n"
+
+                except SQLAlchemyError as e:
+                    logger.error(f"Database error while streaming logs: {str(e)}")
+
+        return generate()
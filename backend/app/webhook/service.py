@@ -3,15 +3,18 @@ from datetime import datetime
 from typing import Dict
 
 from fastapi import HTTPException, Request
+from sqlalchemy import select, update
 from sqlalchemy.exc import SQLAlchemyError
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from starlette import status
 from dotenv import load_dotenv
 
 from svix.webhooks import Webhook, WebhookVerificationError
 
+from auth import user_cache
 from logger import logger
-from models import User
+from models import PingTarget, User
+from utils.cache import result_cache
 
 load_dotenv()
 
@@ -23,7 +26,73 @@ class WebhookService:
         pass
 
     @staticmethod
-    async def create_user(request: Request, payload: Dict, db: Session):
+    def _profile(data: Dict) -> Dict:
+        return {
+            "name": f"{data['first_name']} {data['last_name']}",
+            "email": data['email_addresses'][0]['email_address'],
+            "image": data['profile_image_url'],
+        }
+
+    @staticmethod
+    async def _create_user(data: Dict, db: AsyncSession):
+        db_user = (await db.execute(select(User).where(User.id == data['id']))).scalars().first()
+        if db_user:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="User already exists"
+            )
+
+        db.add(User(
+            id=data['id'],
+            role="User",
+            created_at=datetime.fromtimestamp(data['created_at'] / 1000),
+            **WebhookService._profile(data)
+        ))
+        await db.commit()
+
+        return {
+            "status": "success",
+            "message": "User created successfully",
+        }
+
+    @staticmethod
+    async def _update_user(data: Dict, db: AsyncSession):
+        result = await db.execute(update(User).where(User.id == data['id']).values(**WebhookService._profile(data)))
+        await db.commit()
+        # Drop the cached snapshot so the next request loads the new profile
+        user_cache.pop(data['id'])
+
+        if not result.rowcount:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="User not found"
+            )
+
+        return {
+            "status": "success",
+            "message": "User updated successfully",
+        }
+
+    @staticmethod
+    async def _delete_user(data: Dict, db: AsyncSession):
+        # The user's history is kept; their targets stop being monitored and alerting
+        await db.execute(update(PingTarget).where(PingTarget.user_id == data['id']).values(
+            is_active=False, send_email=False))
+        await db.commit()
+        user_cache.pop(data['id'])
+        await result_cache.invalidate(data['id'])
+
+        return {
+            "status": "success",
+            "message": "User deleted successfully",
+        }
+
+    @staticmethod
+    async def handle_user_event(request: Request, payload: Dict, db: AsyncSession):
+        """
+        Apply a verified user.created, user.updated or user.deleted event. Updates and deletions
+        also evict the user from the auth cache, which would otherwise serve the old row until it expires.
+        """
         try:
             headers = request.headers
             payload_bytes = await request.body()
@@ -31,33 +100,24 @@ class WebhookService:
             wh = Webhook(WEBHOOK_SECRET_KEY)
             msg = wh.verify(payload_bytes, headers)
 
-            db_user = db.query(User).filter(User.id == msg['data']['id']).first()
-            if db_user:
-                raise HTTPException(
-                    status_code=status.HTTP_400_BAD_REQUEST,
-                    detail="User already exists"
-                )
-
-            new_user = User(
-                id=msg['data']['id'],
-                name=f"{msg['data']['first_name']} {msg['data']['last_name']}",
-                email=msg['data']['email_addresses'][0]['email_address'],
-                image=msg['data']['profile_image_url'],
-                role="User",
-                created_at=datetime.fromtimestamp(msg['data']['created_at'] / 1000)
-            )
+            handlers = {
+                "user.created": WebhookService._create_user,
+                "user.updated": WebhookService._update_user,
+                "user.deleted": WebhookService._delete_user,
+            }
+            handler = handlers.get(msg.get('type'))
+            if handler is None:
+                return {
+                    "status": "ignored",
+                    "message": f"Unhandled event type {msg.get('type')}",
+                }
 
-            db.add(new_user)
-            db.commit()
-            db.refresh(new_user)
+            return await handler(msg['data'], db)
 
-            return {
-                "status": "success",
-                "message": "User created successfully",
-            }
+        except HTTPException:
+            raise
 
         except WebhookVerificationError as e:
-            print(f"Webhook verification error: {e}")
             logger.error(f"Webhook verification failed: {str(e)}")
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
@@ -65,18 +125,15 @@ class WebhookService:
             )
 
         except SQLAlchemyError as e:
-            print(f"Database error: {e}")
             logger.error(f"Database error: {str(e)}")
-            db.rollback()
+            await db.rollback()
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail=f"Database error occurred: {str(e)}"
             )
 
         except Exception as e:
-            print(f"Unexpected error: {e}")
-            print(f"Error type: {type(e)}")
-            logger.error(f"Unexpected error: {str(e)}")
+            logger.error(f"Unexpected error ({type(e).__name__}): {str(e)}")
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail=f"Unexpected error: {str(e)}"
@@ -1,48 +1,91 @@
 import os
+import time
 from typing import Annotated, Optional
+
+import jwt
 from logger import logger
 from dotenv import load_dotenv
-from db import db_dependency
+from db import async_db_dependency
 from fastapi import Request, Depends
-from clerk_backend_api import Clerk
-from clerk_backend_api.jwks_helpers import AuthenticateRequestOptions
+from sqlalchemy import inspect, select
+from starlette.concurrency import run_in_threadpool
+from sqlalchemy.orm import make_transient_to_detached
 
 from models import User
+from utils.jwks import JWKSCache
+from utils.ttl_cache import TTLCache
 
 load_dotenv()
 
-sdk = Clerk(bearer_auth=os.getenv('CLERK_SECRET_KEY'))
+CLERK_SECRET_KEY = os.getenv('CLERK_SECRET_KEY')
+CLERK_JWKS_URL = os.getenv('CLERK_JWKS_URL') or 'https://api.clerk.com/v1/jwks'
+JWKS_REFRESH_SECONDS = float(os.getenv('JWKS_REFRESH_SECONDS') or 3600)
+USER_CACHE_SIZE = int(os.getenv('USER_CACHE_SIZE') or 10000)
+USER_CACHE_TTL_SECONDS = float(os.getenv('USER_CACHE_TTL_SECONDS') or 300)
 
 AUTHORIZED_PARTIES = os.getenv("AUTHORIZED_PARTIES")
 
+jwks = JWKSCache(
+    CLERK_JWKS_URL,
+    headers={'Authorization': f'Bearer {CLERK_SECRET_KEY}'} if CLERK_SECRET_KEY else None,
+    refresh_seconds=JWKS_REFRESH_SECONDS,
+)
+
+# Session token -> verified claims, so repeated requests with the same token skip the signature check
+token_cache = TTLCache(maxsize=USER_CACHE_SIZE, ttl=60)
+
+# Verified `sub` -> detached User snapshot, invalidated by the user webhook
+user_cache = TTLCache(maxsize=USER_CACHE_SIZE, ttl=USER_CACHE_TTL_SECONDS)
+
+
+def get_session_token(request: Request) -> Optional[str]:
+    authorization = request.headers.get('Authorization')
+    if authorization and authorization.startswith('Bearer '):
+        return authorization[len('Bearer '):]
+    return request.cookies.get('__session')
+
 
-def get_current_user(request: Request, db: db_dependency):
+def _snapshot(user: User) -> User:
+    # A detached copy holding only column values, safe to share between sessions
+    snapshot = User(**{column.key: getattr(user, column.key) for column in inspect(User).column_attrs})
+    make_transient_to_detached(snapshot)
+    return snapshot
+
+
+async def get_current_user(request: Request, db: async_db_dependency):
     try:
-        request_state = sdk.authenticate_request(
-            request,
-            AuthenticateRequestOptions(
-                authorized_parties=[AUTHORIZED_PARTIES]
-            )
-        )
-        print(f"Request State: {request_state}")
-
-        if not request_state.is_signed_in:
+        token = get_session_token(request)
+        if not token:
             return None
 
-        user_id = request_state.payload['sub']
+        claims = token_cache.get(token)
+        if claims is None or claims['exp'] <= time.time():
+            # Off the event loop: an unknown signing key makes this wait on a JWKS refresh
+            claims = await run_in_threadpool(jwks.verify, token,
+                                             authorized_parties=[AUTHORIZED_PARTIES] if AUTHORIZED_PARTIES else None)
+            token_cache.set(token, claims)
+
+        user_id = claims['sub']
 
         if not user_id:
             return None
 
-        db_user = db.query(User).filter(User.id == user_id).first()
+        snapshot = user_cache.get(user_id)
+        if snapshot is not None:
+            return await db.merge(snapshot, load=False)
+
+        db_user = (await db.execute(select(User).where(User.id == user_id))).scalars().first()
 
         if not db_user:
             return None
 
+        user_cache.set(user_id, _snapshot(db_user))
         return db_user
 
+    except jwt.PyJWTError:
+        return None
+
     except Exception as e:
-        print(f"Unexpected error: {str(e)}")
         logger.error(f"Error in get_current_user: {str(e)}")
 
 
@@ -0,0 +1,404 @@
+"""
+Benchmark of the target and email API endpoints on a large generated dataset.
+
+Generates users with many targets, their ping logs (with the rollups ingestion keeps
+alongside them) and sent emails, then drives the FastAPI app in-process with
+authentication replaced by a header naming the user. Reports p50/p99 latency and
+throughput per endpoint, and the number of SQL queries each request runs. A request
+running more queries than its endpoint's budget fails the run, so N+1 regressions
+show up as a non-zero exit status:
+
+    python -m benchmarks.api_bench --users 10 --targets-per-user 2000 --logs-per-target 1000 \\
+        --db-url postgresql://localhost/pingbot_bench
+
+Run from backend/. Without --db-url a throwaway SQLite file is used. The data is generated
+from --seed; with --reuse an already generated database is benchmarked as is.
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+# Most SQL statements a single request may run, whatever the size of the dataset
+DEFAULT_QUERY_BUDGETS = {
+    "target_list": 2,
+    "dashboard_stats": 2,
+    "target_logs": 2,
+    "email_list": 1,
+}
+
+USER_HEADER = "X-Bench-User"
+BATCH_SIZE = 20000
+
+
+def configure(args) -> str:
+    """
+    Set the environment the app modules read at import time. Returns the database URL.
+    """
+    db_url = args.db_url or f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='api_bench_'), 'bench.db')}"
+    os.environ["DB_URL"] = db_url
+    # Keeps the result cache in-process and never touches a broker
+    os.environ["BROKER_URL"] = "memory://"
+    os.environ["BACKEND_URL"] = "cache+memory://"
+    os.environ["RESULT_CACHE_URL"] = ""
+    os.environ["LOG_STDOUT"] = "0"
+    return db_url
+
+
+def generate(args):
+    """
+    Create the benchmark users, targets, ping logs, rollups and sent emails.
+    """
+    from sqlalchemy import insert, select
+
+    from db import Base, SessionLocal, engine
+    from models import EmailsSent, PingTarget, User
+    from utils.partitions import ensure_partitions
+
+    Base.metadata.create_all(bind=engine)
+    ensure_partitions(engine)
+
+    rng = random.Random(args.seed)
+    now = datetime.datetime.utcnow().replace(microsecond=0)
+    start = now - datetime.timedelta(days=args.days)
+    log_spacing = (now - start) / args.logs_per_target if args.logs_per_target else None
+
+    db = SessionLocal()
+    try:
+        if db.execute(select(User.id).where(User.id == "bench-0")).first() is not None:
+            sys.exit("The benchmark database already holds generated data, pass --reuse or a fresh --db-url")
+
+        started = time.perf_counter()
+        db.add_all([
+            User(id=f"bench-{index}", name=f"Bench {index}", email=f"bench-{index}@example.com", created_at=start)
+            for index in range(args.users)
+        ])
+        db.flush()
+
+        db.execute(insert(PingTarget), [
+            {"user_id": f"bench-{user}", "name": f"target-{index}", "url": f"https://bench-{user}-{index}.example.com/",
+             "send_email": True, "is_down": rng.random() < args.failure_rate, "created_at": start}
+            for user in range(args.users) for index in range(args.targets_per_user)
+        ])
+        db.commit()
+
+        targets = db.execute(select(PingTarget.id, PingTarget.user_id).order_by(PingTarget.id)).all()
+
+        logs = []
+        log_count = 0
+        for target_id, _ in targets:
+            for index in range(args.logs_per_target):
+                failed = rng.random() < args.failure_rate
+                logs.append({
+                    "target_id": target_id,
+                    "status_code": 503 if failed else 200,
+                    "response_time": int(rng.lognormvariate(4, 0.6)),
+                    "created_at": start + log_spacing * index,
+                })
+                if len(logs) >= BATCH_SIZE:
+                    log_count += _write_logs(db, logs)
+                    logs = []
+                    print(f"\r{log_count} ping logs", end="", file=sys.stderr)
+        if logs:
+            log_count += _write_logs(db, logs)
+
+        targets_by_user: Dict[str, List[int]] = {}
+        for target_id, user_id in targets:
+            targets_by_user.setdefault(user_id, []).append(target_id)
+
+        emails = []
+        email_count = 0
+        for user_id, target_ids in targets_by_user.items():
+            for index in range(args.emails_per_user):
+                created_at = start + (now - start) * rng.random()
+                emails.append({
+                    "user_id": user_id,
+                    "target_id": rng.choice(target_ids),
+                    "subject": "🚨 Endpoint Down Alert",
+                    "template_id": "alert_html",
+                    "params": {"user_name": user_id, "endpoint_url": "https://example.com/",
+                               "timestamp": str(created_at), "status_code": 503},
+                    "created_at": created_at,
+                })
+                if len(emails) >= BATCH_SIZE:
+                    db.execute(insert(EmailsSent), emails)
+                    db.commit()
+                    email_count += len(emails)
+                    emails = []
+        if emails:
+            db.execute(insert(EmailsSent), emails)
+            db.commit()
+            email_count += len(emails)
+
+        print(f"\rgenerated {len(targets_by_user)} users, {len(targets)} targets, {log_count} ping logs and "
+              f"{email_count} emails in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+    finally:
+        db.close()
+
+
+def _write_logs(db, logs: List[Dict]) -> int:
+    from sqlalchemy import insert
+
+    from models import PingLogs
+    from utils.rollups import upsert_rollups
+
+    # Same shape as ingestion: raw logs plus the rollups the dashboards read
+    db.execute(insert(PingLogs), logs)
+    upsert_rollups(db, logs)
+    db.commit()
+    return len(logs)
+
+
+class QueryCounter:
+    """
+    Counts the statements sent through an engine and the time they took.
+    """
+
+    def __init__(self, engine):
+        from sqlalchemy import event
+
+        self.count = 0
+        self.seconds = 0.0
+        self._started: List[float] = []
+
+        event.listen(engine, "before_cursor_execute", self._before)
+        event.listen(engine, "after_cursor_execute", self._after)
+
+    def _before(self, *args):
+        self.count += 1
+        self._started.append(time.perf_counter())
+
+    def _after(self, *args):
+        self.seconds += time.perf_counter() - self._started.pop()
+
+    def reset(self):
+        self.count, self.seconds = 0, 0.0
+
+
+def build_app():
+    """
+    The API with authentication replaced: the user is named by the X-Bench-User header.
+    """
+    from fastapi import Request
+    from sqlalchemy import select
+
+    from auth import get_current_user
+    from db import SessionLocal
+    from main import app
+    from models import User
+
+    db = SessionLocal()
+    try:
+        users = {user.id: user for user in db.execute(select(User).where(User.id.like("bench-%"))).scalars()}
+        db.expunge_all()
+    finally:
+        db.close()
+
+    async def bench_user(request: Request):
+        return users.get(request.headers.get(USER_HEADER))
+
+    app.dependency_overrides[get_current_user] = bench_user
+    return app, sorted(users)
+
+
+def request_plan(args, user_ids: List[str], targets_by_user: Dict[str, List[int]]) -> Dict[str, List[Dict]]:
+    """
+    The requests sent to each endpoint, drawn from the seeded RNG.
+    """
+    rng = random.Random(args.seed + 1)
+    plan = {name: [] for name in DEFAULT_QUERY_BUDGETS}
+    for _ in range(args.requests):
+        user_id = rng.choice(user_ids)
+        headers = {USER_HEADER: user_id}
+        plan["target_list"].append({"method": "GET", "url": "/api/target/list", "params": {"hours": args.hours},
+                                    "headers": headers, "user_id": user_id})
+        plan["dashboard_stats"].append({"method": "GET", "url": "/api/target/dashboard-stats",
+                                        "params": {"hours": args.hours}, "headers": headers, "user_id": user_id})
+        target_ids = targets_by_user[user_id]
+        plan["target_logs"].append({"method": "POST", "url": "/api/target/logs", "params": {"limit": args.page_size},
+                                    "json": rng.sample(target_ids, min(len(target_ids), args.logs_targets)),
+                                    "headers": headers, "user_id": user_id})
+        plan["email_list"].append({"method": "GET", "url": "/api/email/list", "params": {"limit": 50},
+                                   "headers": headers, "user_id": user_id})
+    return plan
+
+
+def percentile(values: List[float], q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q * (len(values) - 1))))]
+
+
+async def send(client, request: Dict, warm_cache: bool):
+    from utils.cache import result_cache
+
+    if not warm_cache:
+        # Measure the computed result, not a cache hit
+        result_cache.bump([request["user_id"]])
+
+    started = time.perf_counter()
+    response = await client.request(request["method"], request["url"], params=request["params"],
+                                    json=request.get("json"), headers=request["headers"])
+    elapsed = time.perf_counter() - started
+    if response.status_code != 200:
+        raise RuntimeError(f"{request['method']} {request['url']} returned {response.status_code}: {response.text}")
+    return elapsed
+
+
+async def run(args, app, plan: Dict[str, List[Dict]], counter: QueryCounter, budgets: Dict[str, int]) -> Dict:
+    import httpx
+
+    from db import async_engine
+
+    server = None
+    if args.transport == "http":
+        import uvicorn
+
+        server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=args.port, log_level="warning",
+                                               lifespan="off"))
+        serving = asyncio.create_task(server.serve())
+        while not server.started:
+            await asyncio.sleep(0.01)
+        client = httpx.AsyncClient(base_url=f"http://127.0.0.1:{args.port}", timeout=None,
+                                   limits=httpx.Limits(max_connections=args.concurrency))
+    else:
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench", timeout=None)
+
+    results = {}
+    try:
+        for name, requests in plan.items():
+            # Queries are counted one request at a time so each count belongs to a single request
+            query_counts, query_ms = [], []
+            for request in requests[:args.query_samples]:
+                counter.reset()
+                await send(client, request, args.warm_cache)
+                query_counts.append(counter.count)
+                query_ms.append(counter.seconds * 1000)
+
+            await send(client, requests[0], args.warm_cache)  # Warm up connections and caches
+
+            latencies = []
+            queue = list(requests)
+            started = time.perf_counter()
+
+            async def worker():
+                while queue:
+                    latencies.append(await send(client, queue.pop(), args.warm_cache))
+
+            await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+            elapsed = time.perf_counter() - started
+
+            results[name] = {
+                "requests": len(latencies),
+                "p50_ms": round(percentile(latencies, 0.5) * 1000, 2),
+                "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+                "throughput_rps": round(len(latencies) / elapsed, 1),
+                "queries_max": max(query_counts),
+                "query_ms_avg": round(statistics.mean(query_ms), 2),
+                "query_budget": budgets[name],
+            }
+    finally:
+        await client.aclose()
+        if server is not None:
+            server.should_exit = True
+            await serving
+        # Pooled aiosqlite connections run on non-daemon threads that would keep the process alive
+        await async_engine.dispose()
+
+    return results
+
+
+def parse_budgets(values: List[str]) -> Dict[str, int]:
+    budgets = dict(DEFAULT_QUERY_BUDGETS)
+    for value in values:
+        name, _, budget = value.partition("=")
+        if name not in budgets or not budget.isdigit():
+            raise argparse.ArgumentTypeError(f"Invalid query budget {value!r}, expected one of "
+                                             f"{', '.join(budgets)} followed by =N")
+        budgets[name] = int(budget)
+    return budgets
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("--users", type=int, default=5)
+    parser.add_argument("--targets-per-user", type=int, default=1000)
+    parser.add_argument("--logs-per-target", type=int, default=100)
+    parser.add_argument("--emails-per-user", type=int, default=2000)
+    parser.add_argument("--days", type=int, default=30, help="history the logs and emails are spread over")
+    parser.add_argument("--failure-rate", type=float, default=0.02)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--db-url", help="scratch database, defaults to a temporary SQLite file")
+    parser.add_argument("--reuse", action="store_true", help="benchmark an already generated --db-url")
+    parser.add_argument("--transport", choices=("asgi", "http"), default="asgi",
+                        help="call the app in-process or through uvicorn on localhost")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--requests", type=int, default=200, help="requests per endpoint")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--query-samples", type=int, default=5, help="requests per endpoint whose queries are counted")
+    parser.add_argument("--hours", type=int, default=24, help="window of the list and dashboard requests")
+    parser.add_argument("--logs-targets", type=int, default=10, help="targets per logs request")
+    parser.add_argument("--page-size", type=int, default=1000, help="limit of the logs requests")
+    parser.add_argument("--warm-cache", action="store_true",
+                        help="let repeated requests hit the result cache instead of invalidating it first")
+    parser.add_argument("--budget", action="append", default=[], metavar="ENDPOINT=N",
+                        help="override a query budget, e.g. target_list=3")
+    parser.add_argument("--output", help="write the report as JSON")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    budgets = parse_budgets(args.budget)
+
+    db_url = configure(args)
+    if not args.reuse:
+        generate(args)
+
+    from sqlalchemy import select
+
+    from db import SessionLocal, async_engine
+    from models import PingTarget
+
+    db = SessionLocal()
+    try:
+        targets_by_user: Dict[str, List[int]] = {}
+        for target_id, user_id in db.execute(select(PingTarget.id, PingTarget.user_id)
+                                             .where(PingTarget.user_id.like("bench-%"))):
+            targets_by_user.setdefault(user_id, []).append(target_id)
+    finally:
+        db.close()
+
+    app, user_ids = build_app()
+    if not user_ids:
+        sys.exit(f"No generated data in {db_url}")
+
+    counter = QueryCounter(async_engine.sync_engine)
+    plan = request_plan(args, [user_id for user_id in user_ids if user_id in targets_by_user], targets_by_user)
+    results = asyncio.run(run(args, app, plan, counter, budgets))
+
+    print(f"{'endpoint':<16} {'requests':>8} {'p50 ms':>8} {'p99 ms':>8} {'req/s':>8} {'queries':>7} "
+          f"{'budget':>6} {'query ms':>8}")
+    for name, result in results.items():
+        print(f"{name:<16} {result['requests']:>8} {result['p50_ms']:>8} {result['p99_ms']:>8} "
+              f"{result['throughput_rps']:>8} {result['queries_max']:>7} {result['query_budget']:>6} "
+              f"{result['query_ms_avg']:>8}")
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump({"params": vars(args), "results": results}, file, indent=2)
+
+    over_budget = [name for name, result in results.items() if result["queries_max"] > result["query_budget"]]
+    if over_budget:
+        print(f"\nQuery budget exceeded by: {', '.join(over_budget)}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
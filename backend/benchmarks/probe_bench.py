@@ -0,0 +1,331 @@
+"""
+Benchmark of the monitoring path against a local synthetic target farm.
+
+Starts a farm of local HTTP servers in a separate process, seeds PingTarget rows pointing
+at it and runs monitor_endpoint end to end with Celery in eager mode. Each cycle reports
+wall time, probes/sec, DB write time and peak memory. The farm is generated from --seed,
+so two runs with the same arguments probe exactly the same targets and can be compared:
+
+    python -m benchmarks.probe_bench --targets 5000 --output before.json
+    python -m benchmarks.probe_bench --targets 5000 --baseline before.json
+
+Run from backend/. Without --db-url a throwaway SQLite file is used; with --db-url the
+database must not hold any targets yet (point it at a scratch database).
+"""
+import argparse
+import datetime
+import json
+import math
+import multiprocessing
+import os
+import random
+import resource
+import socket
+import statistics
+import struct
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+
+MODES = ("ok", "error", "hang", "reset")
+
+
+def build_farm(args) -> List[Dict]:
+    """
+    Behaviour of every target, drawn from the seeded RNG: mode and latency in milliseconds.
+    """
+    rng = random.Random(args.seed)
+    weights = {"error": args.error_rate, "hang": args.hang_rate, "reset": args.reset_rate}
+    weights["ok"] = max(0.0, 1 - sum(weights.values()))
+
+    farm = []
+    for index in range(args.targets):
+        if args.latency_dist == "fixed":
+            latency = args.latency_ms
+        elif args.latency_dist == "uniform":
+            latency = rng.uniform(0, 2 * args.latency_ms)
+        else:
+            # Median latency_ms with a long right tail
+            latency = args.latency_ms * math.exp(rng.gauss(0, args.latency_sigma))
+        mode = rng.choices(list(weights), weights=list(weights.values()))[0]
+        farm.append({"path": f"/t/{index}", "mode": mode, "latency_ms": round(latency, 2)})
+    return farm
+
+
+def serve_farm(farm: List[Dict], hosts: int, hang_seconds: float, ready: multiprocessing.Queue):
+    """
+    Farm process: one threaded HTTP server per host, each answering for its share of the targets.
+    """
+    behaviour = {target["path"]: target for target in farm}
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_HEAD(self):
+            target = behaviour.get(self.path.split("?", 1)[0])
+            if target is None:
+                self.send_response(404)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+
+            time.sleep(target["latency_ms"] / 1000)
+            if target["mode"] == "hang":
+                time.sleep(hang_seconds)
+            elif target["mode"] == "reset":
+                # Linger 0 makes close() send a RST instead of a FIN
+                self.connection.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, struct.pack("ii", 1, 0))
+                self.connection.close()
+                self.close_connection = True
+                return
+
+            self.send_response(500 if target["mode"] == "error" else 200)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+
+        def log_message(self, format, *args):
+            pass
+
+    class Server(ThreadingHTTPServer):
+        daemon_threads = True
+        request_queue_size = 1024
+
+        def handle_error(self, request, client_address):
+            pass  # Resets and client-side timeouts are expected
+
+    ports = []
+    for _ in range(hosts):
+        server = Server(("127.0.0.1", 0), Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        ports.append(server.server_address[1])
+    ready.put(ports)
+    threading.Event().wait()
+
+
+def start_farm(farm: List[Dict], args) -> (multiprocessing.Process, List[int]):
+    ready = multiprocessing.Queue()
+    process = multiprocessing.Process(target=serve_farm, args=(farm, args.hosts, args.hang_seconds, ready),
+                                      daemon=True)
+    process.start()
+    return process, ready.get(timeout=30)
+
+
+def configure(args) -> str:
+    """
+    Set the environment the worker modules read at import time. Returns the database URL.
+    """
+    db_url = args.db_url or f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='probe_bench_'), 'bench.db')}"
+    os.environ["DB_URL"] = db_url
+    # Celery runs eagerly and alerts are disabled, so neither a broker nor a result backend is used
+    os.environ["BROKER_URL"] = "memory://"
+    os.environ["BACKEND_URL"] = "cache+memory://"
+    os.environ["RESULT_CACHE_URL"] = ""
+    os.environ["LOG_STDOUT"] = "0"
+    os.environ["MONITOR_SHARDS"] = str(args.shards)
+    os.environ["MONITOR_CYCLE_BUDGET_SECONDS"] = str(args.budget)
+    if args.concurrency:
+        os.environ["PROBE_CONCURRENCY"] = str(args.concurrency)
+    return db_url
+
+
+def target_url(target: Dict, ports: List[int]) -> str:
+    return f"http://127.0.0.1:{ports[int(target['path'].rsplit('/', 1)[1]) % len(ports)]}{target['path']}"
+
+
+def seed(farm: List[Dict], ports: List[int], args):
+    from sqlalchemy import insert
+
+    from db import Base, SessionLocal, engine
+    from models import PingTarget, User
+    from utils.partitions import ensure_partitions
+
+    Base.metadata.create_all(bind=engine)
+    ensure_partitions(engine)
+
+    db = SessionLocal()
+    try:
+        if db.query(PingTarget.id).first() is not None:
+            sys.exit("The benchmark database already holds targets, point --db-url at a scratch database")
+
+        now = datetime.datetime.utcnow()
+        db.add_all([
+            User(id=f"bench-{index}", name=f"Bench {index}", email=f"bench-{index}@example.com", created_at=now)
+            for index in range(args.users)
+        ])
+        db.flush()
+
+        rng = random.Random(args.seed + 1)
+        rows, seen = [], set()
+        for index, target in enumerate(farm):
+            user_id = f"bench-{index % args.users}"
+            # A share of the targets monitors a URL another user already monitors
+            source = farm[rng.randrange(index)] if index and rng.random() < args.duplicate_rate else target
+            url = target_url(source, ports)
+            if (user_id, url) in seen:
+                url = target_url(target, ports)
+            seen.add((user_id, url))
+            rows.append({"user_id": user_id, "name": f"target-{index}", "url": url, "send_email": False})
+        db.execute(insert(PingTarget), rows)
+        db.commit()
+    finally:
+        db.close()
+
+
+def run_cycles(args) -> List[Dict]:
+    from celery.signals import task_postrun
+
+    from utils import celery_worker
+
+    celery_worker.app.conf.task_always_eager = True
+
+    captured = {"shards": [], "cycle": None}
+
+    def on_postrun(sender=None, retval=None, **kwargs):
+        if sender.name == celery_worker.monitor_shard.name:
+            captured["shards"].append(retval)
+        elif sender.name == celery_worker.collect_cycle_stats.name:
+            captured["cycle"] = retval
+
+    task_postrun.connect(on_postrun, weak=False)
+
+    cycles = []
+    for number in range(1, args.cycles + 1):
+        captured["shards"], captured["cycle"] = [], None
+        if args.tracemalloc:
+            tracemalloc.start()
+
+        started = time.perf_counter()
+        celery_worker.monitor_endpoint()
+        wall_seconds = time.perf_counter() - started
+
+        peak_traced = None
+        if args.tracemalloc:
+            peak_traced = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+        cycle_stats = captured["cycle"] or {}
+        db_write_ms = sum(shard["writer"]["avg_flush_ms"] * shard["writer"]["flushes"] for shard in captured["shards"])
+        requests = cycle_stats.get("requests", cycle_stats.get("probed", 0))
+        cycles.append({
+            "cycle": number,
+            "wall_seconds": round(wall_seconds, 3),
+            "targets": cycle_stats.get("targets", 0),
+            "requests": requests,
+            "probed": cycle_stats.get("probed", 0),
+            "down": cycle_stats.get("down", 0),
+            "deferred": cycle_stats.get("deferred", 0),
+            "probes_per_second": round(requests / wall_seconds, 1) if wall_seconds else 0.0,
+            "db_write_ms": round(db_write_ms, 1),
+            "rows_written": cycle_stats.get("rows_written", 0),
+            "peak_traced_mb": round(peak_traced / 2 ** 20, 1) if peak_traced is not None else None,
+            "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        })
+    return cycles
+
+
+def summarize(cycles: List[Dict]) -> Dict:
+    # The first cycle opens every connection; later cycles show the steady state
+    steady = cycles[1:] or cycles
+    return {
+        key: round(statistics.median(cycle[key] for cycle in steady), 3)
+        for key in ("wall_seconds", "probes_per_second", "db_write_ms")
+    } | {"peak_rss_mb": max(cycle["peak_rss_mb"] for cycle in cycles)}
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_report(report: Dict, baseline: Optional[Dict]):
+    print(f"{'cycle':>5} {'wall s':>8} {'probes/s':>9} {'db ms':>8} {'rows':>7} {'down':>6} "
+          f"{'deferred':>8} {'rss MB':>7} {'traced MB':>9}")
+    for cycle in report["cycles"]:
+        print(f"{cycle['cycle']:>5} {cycle['wall_seconds']:>8} {cycle['probes_per_second']:>9} "
+              f"{cycle['db_write_ms']:>8} {cycle['rows_written']:>7} {cycle['down']:>6} {cycle['deferred']:>8} "
+              f"{cycle['peak_rss_mb']:>7} {cycle['peak_traced_mb'] if cycle['peak_traced_mb'] is not None else '-':>9}")
+
+    print(f"\nsummary (median of steady-state cycles): {report['summary']}")
+    if baseline is None:
+        return
+
+    if baseline["params"] != report["params"]:
+        print("warning: the baseline was recorded with different parameters")
+    print(f"vs baseline {baseline.get('revision') or '?'}:")
+    for key, value in report["summary"].items():
+        before = baseline["summary"].get(key)
+        if before:
+            print(f"  {key}: {before} -> {value} ({(value - before) / before * 100:+.1f}%)")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("--targets", type=int, default=1000)
+    parser.add_argument("--users", type=int, default=10)
+    parser.add_argument("--hosts", type=int, default=8, help="servers in the farm; targets are spread over them")
+    parser.add_argument("--cycles", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--latency-dist", choices=("fixed", "uniform", "lognormal"), default="lognormal")
+    parser.add_argument("--latency-ms", type=float, default=50, help="median latency")
+    parser.add_argument("--latency-sigma", type=float, default=0.8, help="spread of the lognormal distribution")
+    parser.add_argument("--error-rate", type=float, default=0.02, help="share of targets answering 500")
+    parser.add_argument("--hang-rate", type=float, default=0.01, help="share of targets that never answer")
+    parser.add_argument("--reset-rate", type=float, default=0.01, help="share of targets resetting the connection")
+    parser.add_argument("--hang-seconds", type=float, default=30)
+    parser.add_argument("--duplicate-rate", type=float, default=0.0,
+                        help="share of targets monitoring a URL another user already monitors")
+    parser.add_argument("--shards", type=int, default=8)
+    parser.add_argument("--budget", type=float, default=60, help="MONITOR_CYCLE_BUDGET_SECONDS")
+    parser.add_argument("--concurrency", type=int, help="PROBE_CONCURRENCY")
+    parser.add_argument("--db-url", help="scratch database, defaults to a temporary SQLite file")
+    parser.add_argument("--tracemalloc", action="store_true",
+                        help="also trace Python allocations (slows the cycle down)")
+    parser.add_argument("--output", help="write the report as JSON")
+    parser.add_argument("--baseline", help="JSON report of an earlier run to compare against")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    params = {key: value for key, value in vars(args).items()
+              if key not in ("db_url", "output", "baseline", "tracemalloc")}
+
+    db_url = configure(args)
+    farm = build_farm(args)
+    farm_process, ports = start_farm(farm, args)
+    try:
+        seed(farm, ports, args)
+        modes = {mode: sum(1 for target in farm if target["mode"] == mode) for mode in MODES}
+        print(f"farm: {args.targets} targets on {len(ports)} hosts {modes}, db: {db_url}")
+        cycles = run_cycles(args)
+    finally:
+        farm_process.terminate()
+
+    report = {
+        "revision": git_revision(),
+        "params": params,
+        "cycles": cycles,
+        "summary": summarize(cycles),
+    }
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+    print_report(report, baseline)
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(report, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
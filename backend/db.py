@@ -5,12 +5,19 @@ import os
 
 from fastapi import Depends
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, Session
 
+from utils.metrics import instrument_engine
+
 load_dotenv()
 
 DB_URL = os.getenv("DB_URL")
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE") or 20)
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW") or 10)
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT") or 30)
 
 engine = create_engine(DB_URL)
 
@@ -19,6 +26,40 @@ Base = declarative_base()
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 
+def async_url(url: str):
+    """
+    The async driver URL for DB_URL: asyncpg for Postgres, aiosqlite for SQLite.
+    """
+    url = make_url(url)
+    if url.get_backend_name() == "postgresql":
+        url = url.set(drivername="postgresql+asyncpg")
+        # asyncpg takes `ssl` instead of libpq's `sslmode`
+        if "sslmode" in url.query:
+            url = url.update_query_dict({"ssl": url.query["sslmode"]}).difference_update_query(["sslmode"])
+    elif url.get_backend_name() == "sqlite":
+        url = url.set(drivername="sqlite+aiosqlite")
+    return url
+
+
+ASYNC_DB_URL = async_url(DB_URL)
+
+# The API's concurrency is bounded by this pool rather than by the threadpool
+async_engine = create_async_engine(
+    ASYNC_DB_URL,
+    **({} if ASYNC_DB_URL.get_backend_name() == "sqlite" else {
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_pre_ping": True,
+    })
+)
+
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+instrument_engine(engine, "sync")
+instrument_engine(async_engine.sync_engine, "async")
+
+
 def get_db():
     db = SessionLocal()
     try:
@@ -27,4 +68,10 @@ def get_db():
         db.close()
 
 
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
 db_dependency = Annotated[Session, Depends(get_db)]
+async_db_dependency = Annotated[AsyncSession, Depends(get_async_db)]
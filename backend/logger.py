@@ -1,9 +1,108 @@
+import atexit
+import copy
+import datetime
+import json
 import logging
+import os
+import queue
+import random
+import sys
+from logging.handlers import QueueHandler, QueueListener
 
-logging.basicConfig(
-    filename='info.log',
-    level=logging.INFO,
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
-)
+from dotenv import load_dotenv
 
-logger = logging.getLogger("app_logger")
+load_dotenv()
+
+LOG_FILE = os.getenv("LOG_FILE") or "info.log"
+LOG_LEVEL = (os.getenv("LOG_LEVEL") or "INFO").upper()
+LOG_STDOUT = (os.getenv("LOG_STDOUT") or "1") == "1"
+# Share of high-volume events (one per probe) that are kept
+LOG_SAMPLE_RATE = float(os.getenv("LOG_SAMPLE_RATE") or 0.01)
+# Share of failed probes that are logged; their reasons are only in the log, so all are kept by default
+LOG_FAILURE_SAMPLE_RATE = float(os.getenv("LOG_FAILURE_SAMPLE_RATE") or 1)
+
+# Attributes every LogRecord has; anything else on a record came from `extra`
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime", "taskName"}
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    One JSON object per line: time, level, logger and message, plus every field passed in `extra`.
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.datetime.fromtimestamp(record.created, datetime.timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        entry.update({key: value for key, value in vars(record).items() if key not in _RECORD_ATTRIBUTES})
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Keeps a record logged with a `sample_rate` with that probability, so per-probe events can
+    be logged without one line per probe. Runs before the record is queued.
+    """
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        rate = getattr(record, "sample_rate", None)
+        return rate is None or random.random() < rate
+
+
+class _QueueHandler(QueueHandler):
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Resolve the message and traceback before queueing, but keep the traceback out of the message
+        record = copy.copy(record)
+        record.msg, record.args = record.getMessage(), None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def sampled(event: str, rate: float = LOG_SAMPLE_RATE, **fields) -> dict:
+    """
+    `extra` for a high-volume event: only `rate` of them are written, each tagged with the rate.
+    """
+    return {"event": event, "sample_rate": rate, **fields}
+
+
+def _setup() -> logging.Logger:
+    """
+    Callers only put records on a queue; a listener thread formats and writes them, so file and
+    stdout I/O never happen on the request or probe path.
+    """
+    formatter = JsonFormatter()
+    handlers = [logging.FileHandler(LOG_FILE)]
+    if LOG_STDOUT:
+        handlers.append(logging.StreamHandler(sys.stdout))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    records = queue.SimpleQueue()
+    listener = QueueListener(records, *handlers, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+
+    queue_handler = _QueueHandler(records)
+    queue_handler.addFilter(SamplingFilter())
+
+    root = logging.getLogger()
+    root.setLevel(LOG_LEVEL)
+    root.addHandler(queue_handler)
+    # httpx logs every request at INFO, once per probe; the worker logs probe results itself, sampled
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    # Celery replaces the root handlers in workers, so the app logger keeps its own
+    app_logger = logging.getLogger("app_logger")
+    app_logger.addHandler(queue_handler)
+    app_logger.propagate = False
+    return app_logger
+
+
+logger = _setup()
@@ -7,18 +7,27 @@ from dotenv import load_dotenv
 from app.email.router import email_router
 from app.target.router import target_router
 from app.webhook.router import webhook_router
-from db import engine, Base
+from db import async_engine, engine, Base
+from utils.metrics import API_METRICS_PORT, MetricsMiddleware, start_exporter
+from utils.partitions import maintain_partitions
+from utils.schema import upgrade_schema
 from utils.scheduler import scheduler
 
 load_dotenv()
 
 Base.metadata.create_all(bind=engine)
+upgrade_schema(engine)
+maintain_partitions(engine)
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     scheduler.start()
+    metrics_server = start_exporter(API_METRICS_PORT)
     yield
+    if metrics_server is not None:
+        metrics_server.shutdown()
+    await async_engine.dispose()
 
 
 app = FastAPI(
@@ -32,7 +41,9 @@ app.add_middleware(CORSMiddleware,
                    allow_origins=["*"],
                    allow_credentials=True,
                    allow_methods=["*"],
-                   allow_headers=["*"], )
+                   allow_headers=["*"],
+                   expose_headers=["X-Next-Cursor"], )
+app.add_middleware(MetricsMiddleware)
 
 
 def custom_openapi():
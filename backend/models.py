@@ -1,8 +1,12 @@
-from sqlalchemy import Integer, ForeignKey, Boolean, func, UniqueConstraint
-from sqlalchemy import Column, String, Enum, DateTime
-from sqlalchemy.orm import relationship
+from sqlalchemy import Integer, BigInteger, ForeignKey, Boolean, func, UniqueConstraint, Index, PrimaryKeyConstraint
+from sqlalchemy import Column, String, Enum, DateTime, JSON, LargeBinary
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.orm import deferred, relationship
 
 from db import Base
+from utils.urls import url_hash
+
+MIN_INTERVAL_SECONDS = 30  # shortest time allowed between two checks of a target
 
 user_role_enum = Enum(
     "User",
@@ -43,10 +47,17 @@ class EmailsSent(Base):
     )
     user_id = Column(String, ForeignKey('users.id'), nullable=False)
     subject = Column(String(255), nullable=False)
-    body = Column(String, nullable=False)
+    template_id = Column(String(50), nullable=True)
+    params = deferred(Column(JSON, nullable=True))  # Template values, rendered only when the body is requested
+    body = deferred(Column(String, nullable=True))  # Rendered HTML, only kept for emails recorded before template_id
+    digest_id = Column(String(32), nullable=True, index=True)  # Shared by the rows of one digest email
 
     created_at = Column(DateTime, nullable=False, default=func.now())
 
+    __table_args__ = (
+        Index('ix_emails_sent_user_id_created_at', 'user_id', 'created_at'),
+    )
+
     user = relationship("User", back_populates="emails")
     target = relationship("PingTarget", back_populates="emails")
 
@@ -61,6 +72,11 @@ class PingTarget(Base):
     send_email = Column(Boolean, nullable=False)
     is_down = Column(Boolean, default=False, nullable=False)
     is_active = Column(Boolean, default=True, nullable=False)
+    interval_seconds = Column(Integer, default=900, nullable=False)  # time between checks
+    jitter_seconds = Column(Integer, default=0, nullable=False)  # random spread added to each check
+    # Hash of the normalized URL: targets sharing a URL are sharded and scheduled together and probed once
+    url_hash = Column(BigInteger, nullable=True, index=True,
+                      default=lambda context: url_hash(context.get_current_parameters()["url"]))
 
     created_at = Column(DateTime, nullable=False, default=func.now())
 
@@ -80,7 +96,63 @@ class PingLogs(Base):
     target_id = Column(Integer, ForeignKey('ping_targets.id'), nullable=False)
     status_code = Column(Integer, nullable=False)
     response_time = Column(Integer, nullable=False)  # in milliseconds
+    # Phases of response_time, in milliseconds; connect/tls are null when a kept-alive connection was reused
+    dns_time = Column(Integer, nullable=True)
+    connect_time = Column(Integer, nullable=True)
+    tls_time = Column(Integer, nullable=True)
+    ttfb_time = Column(Integer, nullable=True)
 
     created_at = Column(DateTime, nullable=False, default=func.now())
 
+    __table_args__ = (
+        Index('ix_ping_logs_target_id_created_at', 'target_id', 'created_at'),
+        {
+            'postgresql_partition_by': 'RANGE (created_at)',  # partitions are managed by utils/partitions.py
+            'info': {'partition_key': 'created_at'},
+        },
+    )
+
     target = relationship("PingTarget", back_populates="logs")
+
+
+@compiles(PrimaryKeyConstraint, "postgresql")
+def _partitioned_primary_key(constraint, compiler, **kw):
+    # Postgres requires the partition key in the primary key of a partitioned table
+    partition_key = constraint.table.info.get('partition_key')
+    if partition_key is None or partition_key in constraint.columns:
+        return compiler.visit_primary_key_constraint(constraint, **kw)
+
+    columns = [column.name for column in constraint.columns] + [partition_key]
+    return "PRIMARY KEY (%s)" % ", ".join(compiler.preparer.quote(column) for column in columns)
+
+
+class PingRollupHourly(Base):
+    __tablename__ = "ping_rollups_hourly"
+
+    target_id = Column(Integer, ForeignKey('ping_targets.id', ondelete="CASCADE"), primary_key=True)
+    bucket_start = Column(DateTime, primary_key=True)
+    total_checks = Column(Integer, nullable=False, default=0)
+    successful_checks = Column(Integer, nullable=False, default=0)
+    response_time_sum = Column(BigInteger, nullable=False, default=0)  # in milliseconds
+    response_time_min = Column(Integer, nullable=False)
+    response_time_max = Column(Integer, nullable=False)
+
+
+class PingRollupDaily(Base):
+    __tablename__ = "ping_rollups_daily"
+
+    target_id = Column(Integer, ForeignKey('ping_targets.id', ondelete="CASCADE"), primary_key=True)
+    bucket_start = Column(DateTime, primary_key=True)
+    total_checks = Column(Integer, nullable=False, default=0)
+    successful_checks = Column(Integer, nullable=False, default=0)
+    response_time_sum = Column(BigInteger, nullable=False, default=0)  # in milliseconds
+    response_time_min = Column(Integer, nullable=False)
+    response_time_max = Column(Integer, nullable=False)
+
+
+class PingLatencyHourly(Base):
+    __tablename__ = "ping_latency_hourly"
+
+    target_id = Column(Integer, ForeignKey('ping_targets.id', ondelete="CASCADE"), primary_key=True)
+    bucket_start = Column(DateTime, primary_key=True)
+    sketch = Column(LargeBinary, nullable=False)  # Serialized DDSketch of the response times, in milliseconds
@@ -1,3 +1,4 @@
 #!/bin/bash
-uvicorn main:app --host 0.0.0.0 --port 8000 &
-celery -A utils.celery_worker worker --loglevel=info -P solo
+API_METRICS_PORT=9102 uvicorn main:app --host 0.0.0.0 --port 8000 &
+WORKER_METRICS_PORT=9101 celery -A utils.celery_worker worker --loglevel=info -P solo -Q email -n email@%h &
+WORKER_METRICS_PORT=9100 celery -A utils.celery_worker worker --loglevel=info -P solo -Q celery
@@ -0,0 +1,74 @@
+import math
+import random
+
+import pytest
+
+from utils.ddsketch import SKETCH_RELATIVE_ACCURACY, DDSketch
+
+QUANTILES = (0, 0.01, 0.1, 0.25, 0.5, 0.75, 0.9, 0.95, 0.99, 0.999, 1)
+
+
+def exact_quantile(values, q):
+    # The rank DDSketch.quantile answers for: the value at position floor(q * (n - 1))
+    return sorted(values)[math.floor(q * (len(values) - 1))]
+
+
+def sketch_of(values):
+    sketch = DDSketch()
+    for value in values:
+        sketch.add(value)
+    return sketch
+
+
+@pytest.fixture
+def latencies():
+    # Log-normal like real response times: median around 150 ms with a long tail
+    rng = random.Random(42)
+    return [rng.lognormvariate(5, 1) for _ in range(20000)]
+
+
+@pytest.mark.parametrize("q", QUANTILES)
+def test_quantile_within_relative_accuracy(latencies, q):
+    expected = exact_quantile(latencies, q)
+    assert sketch_of(latencies).quantile(q) == pytest.approx(expected, rel=SKETCH_RELATIVE_ACCURACY)
+
+
+def test_quantile_within_relative_accuracy_on_uniform_values():
+    rng = random.Random(7)
+    values = [rng.uniform(1, 10000) for _ in range(5000)]
+    sketch = sketch_of(values)
+    for q in QUANTILES:
+        assert sketch.quantile(q) == pytest.approx(exact_quantile(values, q), rel=SKETCH_RELATIVE_ACCURACY)
+
+
+def test_merge_equals_single_sketch(latencies):
+    merged = DDSketch()
+    for start in range(0, len(latencies), 1000):
+        merged.merge(sketch_of(latencies[start:start + 1000]))
+
+    whole = sketch_of(latencies)
+    assert merged.count == whole.count
+    assert [merged.quantile(q) for q in QUANTILES] == [whole.quantile(q) for q in QUANTILES]
+
+
+def test_zero_values_are_counted_separately():
+    sketch = sketch_of([0, 0, 0, 100])
+    assert sketch.count == 4
+    assert sketch.quantile(0.5) == 0.0
+    assert sketch.quantile(1) == pytest.approx(100, rel=SKETCH_RELATIVE_ACCURACY)
+
+
+def test_empty_sketch_has_no_quantile():
+    assert DDSketch().quantile(0.5) is None
+
+
+def test_bytes_round_trip(latencies):
+    sketch = sketch_of(latencies + [0])
+    restored = DDSketch.from_bytes(sketch.to_bytes())
+    assert restored.count == sketch.count
+    assert [restored.quantile(q) for q in QUANTILES] == [sketch.quantile(q) for q in QUANTILES]
+
+
+def test_merge_rejects_different_accuracy():
+    with pytest.raises(ValueError):
+        DDSketch(0.01).merge(DDSketch(0.02))
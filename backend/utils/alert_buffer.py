@@ -0,0 +1,70 @@
+import json
+import os
+from typing import Dict, List, Optional
+
+import redis
+from dotenv import load_dotenv
+from redis.connection import ssl
+
+load_dotenv()
+
+BROKER_URL = os.getenv("BROKER_URL")
+
+
+class AlertBuffer:
+    """
+    Redis list that collects alerts across monitoring cycles for one coalescing window.
+
+    The first add of a window claims a flush flag, which tells the caller to schedule the flush
+    `window` seconds later. drain() takes the whole buffer and releases the flag atomically, so
+    alerts added after a drain start the next window. If the flush task is lost, the flag
+    expires on its own and claim_stranded() lets a periodic sweep schedule the flush instead.
+    """
+
+    def __init__(self, url: str, key: str = "pingbot:alerts"):
+        self.url = url
+        self.key = key
+        self.flush_key = f"{key}:flush"
+        self._client: Optional[redis.Redis] = None
+
+    @property
+    def client(self) -> redis.Redis:
+        if self._client is None:
+            # Same certificate handling as the Celery broker connection
+            options = {"ssl_cert_reqs": ssl.CERT_NONE} if self.url.startswith("rediss://") else {}
+            self._client = redis.Redis.from_url(self.url, **options)
+        return self._client
+
+    @staticmethod
+    def _flag_ttl(window: int) -> int:
+        # Outlives a flush scheduled `window` seconds ahead, so the sweep never races a live one
+        return window * 2 + 60
+
+    def add(self, alerts: List[Dict], window: int) -> bool:
+        """
+        Buffer alerts and return True if the caller has to schedule the flush for this window.
+        """
+        pipeline = self.client.pipeline()
+        pipeline.rpush(self.key, *(json.dumps(alert) for alert in alerts))
+        pipeline.set(self.flush_key, 1, nx=True, ex=self._flag_ttl(window))
+        _, claimed = pipeline.execute()
+        return bool(claimed)
+
+    def claim_stranded(self, window: int) -> bool:
+        """
+        Return True if alerts are buffered without a pending flush, claiming the flag for the caller.
+        """
+        if not self.client.llen(self.key):
+            return False
+        return bool(self.client.set(self.flush_key, 1, nx=True, ex=self._flag_ttl(window)))
+
+    def drain(self) -> List[Dict]:
+        pipeline = self.client.pipeline()
+        pipeline.lrange(self.key, 0, -1)
+        pipeline.delete(self.key, self.flush_key)
+        alerts, _ = pipeline.execute()
+        return [json.loads(alert) for alert in alerts]
+
+
+# Buffering needs a Redis broker; without one dispatch_alerts sends every cycle's alerts directly
+alert_buffer = AlertBuffer(BROKER_URL) if BROKER_URL and BROKER_URL.startswith(("redis://", "rediss://")) else None
@@ -0,0 +1,156 @@
+import json
+import os
+import threading
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+import redis
+import redis.asyncio
+from dotenv import load_dotenv
+from redis.connection import ssl
+
+from logger import logger
+from utils.ttl_cache import TTLCache
+
+load_dotenv()
+
+RESULT_CACHE_URL = os.getenv("RESULT_CACHE_URL") or os.getenv("BROKER_URL")
+RESULT_CACHE_TTL_SECONDS = int(os.getenv("RESULT_CACHE_TTL_SECONDS") or 300)
+RESULT_CACHE_SIZE = int(os.getenv("RESULT_CACHE_SIZE") or 10000)
+
+
+class ResultCache:
+    """
+    Per-user cache of computed API results, invalidated through a per-user version stamp.
+
+    Every cached result is stored with the user's version at the time its computation started.
+    Ingestion and target edits bump the version, so results computed before a change are never
+    served after it, even if they are stored late. With Redis each user is one hash holding the
+    version and the results, and a lookup is a single HMGET. Without Redis an in-process cache is
+    used: edits made through the API still invalidate it, but results only pick up new monitoring
+    cycles (written by the Celery worker, another process) after RESULT_CACHE_TTL_SECONDS.
+    """
+
+    def __init__(self, url: Optional[str] = None, ttl: int = RESULT_CACHE_TTL_SECONDS,
+                 maxsize: int = RESULT_CACHE_SIZE, prefix: str = "pingbot:results"):
+        self.url = url if url and url.startswith(("redis://", "rediss://")) else None
+        self.ttl = ttl
+        self.prefix = prefix
+
+        self._client: Optional[redis.Redis] = None
+        self._async_client: Optional[redis.asyncio.Redis] = None
+
+        self._entries = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._versions: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def _options(self) -> Dict:
+        # Same certificate handling as the Celery broker connection
+        return {"ssl_cert_reqs": ssl.CERT_NONE} if self.url.startswith("rediss://") else {}
+
+    @property
+    def client(self) -> redis.Redis:
+        if self._client is None:
+            self._client = redis.Redis.from_url(self.url, **self._options())
+        return self._client
+
+    @property
+    def async_client(self) -> redis.asyncio.Redis:
+        if self._async_client is None:
+            self._async_client = redis.asyncio.Redis.from_url(self.url, **self._options())
+        return self._async_client
+
+    def _key(self, user_id: str) -> str:
+        return f"{self.prefix}:{user_id}"
+
+    @staticmethod
+    def _field(name: str, params: Tuple) -> str:
+        return json.dumps([name, *params])
+
+    async def get(self, user_id: str, name: str, *params) -> Tuple[Optional[Any], int]:
+        """
+        Return the cached result (None on a miss) and the user's current version, which has
+        to be passed to `set` along with the freshly computed result.
+        """
+        field = self._field(name, params)
+
+        if self.url is None:
+            version = self._versions.get(user_id, 0)
+            entry = self._entries.get((user_id, field))
+            if entry is not None and entry[0] == version:
+                return entry[1], version
+            return None, version
+
+        try:
+            version, entry = await self.async_client.hmget(self._key(user_id), ["version", field])
+        except redis.RedisError as e:
+            logger.error(f"Result cache lookup failed: {str(e)}")
+            return None, -1
+
+        version = int(version or 0)
+        if entry is not None:
+            entry = json.loads(entry)
+            if entry["version"] == version:
+                return entry["value"], version
+        return None, version
+
+    async def set(self, user_id: str, name: str, *params, value: Any, version: int):
+        field = self._field(name, params)
+
+        if self.url is None:
+            self._entries.set((user_id, field), (version, value))
+            return
+
+        if version < 0:
+            return
+
+        try:
+            key = self._key(user_id)
+            pipeline = self.async_client.pipeline(transaction=False)
+            pipeline.hset(key, field, json.dumps({"version": version, "value": value}))
+            pipeline.expire(key, self.ttl)
+            await pipeline.execute()
+        except redis.RedisError as e:
+            logger.error(f"Result cache store failed: {str(e)}")
+
+    async def invalidate(self, user_id: str):
+        """
+        Invalidate a user's results after they changed their targets.
+        """
+        if self.url is None:
+            self.bump([user_id])
+            return
+
+        try:
+            key = self._key(user_id)
+            pipeline = self.async_client.pipeline(transaction=False)
+            pipeline.hincrby(key, "version", 1)
+            pipeline.expire(key, self.ttl)
+            await pipeline.execute()
+        except redis.RedisError as e:
+            logger.error(f"Result cache invalidation failed: {str(e)}")
+
+    def bump(self, user_ids: Iterable[str]):
+        """
+        Invalidate the results of every given user. Synchronous, for the ingestion path.
+        """
+        user_ids = set(user_ids)
+        if not user_ids:
+            return
+
+        if self.url is None:
+            with self._lock:
+                for user_id in user_ids:
+                    self._versions[user_id] = self._versions.get(user_id, 0) + 1
+            return
+
+        try:
+            pipeline = self.client.pipeline(transaction=False)
+            for user_id in sorted(user_ids):
+                pipeline.hincrby(self._key(user_id), "version", 1)
+                pipeline.expire(self._key(user_id), self.ttl)
+            pipeline.execute()
+        except redis.RedisError as e:
+            logger.error(f"Result cache invalidation failed: {str(e)}")
+
+
+result_cache = ResultCache(RESULT_CACHE_URL)
@@ -1,12 +1,24 @@
 import datetime
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional
 
-from celery import Celery
-import requests
+from celery import Celery, chord
+from celery.signals import worker_init
+from celery.exceptions import Retry
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
 from redis.connection import ssl
 
 from db import SessionLocal
-from models import PingTarget, PingLogs
-from utils.send_email import send_mail
+from logger import logger, sampled
+from models import MIN_INTERVAL_SECONDS, PingTarget, User
+from utils.log_writer import PingLogWriter
+from utils.probe import is_failure, plan_probes, run_probes
+from utils.alert_buffer import alert_buffer
+from utils.metrics import (ALERT_EMAILS, ALERT_SEND_DURATION, CYCLE_DURATION, PROBE_DURATION, QUEUE_LAG,
+                           SHARD_DURATION, TARGETS_DEFERRED, WORKER_METRICS_PORT, probe_outcome, start_exporter)
+from utils.send_email import EMAIL_BATCH_SIZE, EmailSendError, record_sent, render_digests, send_batch
 import os
 from dotenv import load_dotenv
 
@@ -14,6 +26,14 @@ load_dotenv()
 
 BROKER_URL = os.getenv("BROKER_URL")
 BACKEND_URL = os.getenv("BACKEND_URL")
+MONITOR_SHARDS = int(os.getenv("MONITOR_SHARDS") or 8)
+TARGET_SNAPSHOT_CHUNK = int(os.getenv("TARGET_SNAPSHOT_CHUNK") or 1000)
+# A cycle must end before the shortest interval makes its targets due again, otherwise two cycles
+# probe the same target at once and write duplicate logs and alerts; longer budgets are clamped
+MONITOR_CYCLE_BUDGET_SECONDS = min(float(os.getenv("MONITOR_CYCLE_BUDGET_SECONDS") or 25), MIN_INTERVAL_SECONDS - 5)
+ALERT_DIGEST_WINDOW_SECONDS = int(os.getenv("ALERT_DIGEST_WINDOW_SECONDS") or 0)
+EMAIL_MAX_RETRIES = int(os.getenv("EMAIL_MAX_RETRIES") or 5)
+EMAIL_RETRY_BACKOFF_SECONDS = int(os.getenv("EMAIL_RETRY_BACKOFF_SECONDS") or 10)
 
 app = Celery('celery_worker', broker=BROKER_URL, backend=BACKEND_URL)
 
@@ -25,46 +45,289 @@ app.conf.redis_backend_use_ssl = {
     "ssl_cert_reqs": ssl.CERT_NONE
 }
 
+
+@worker_init.connect
+def start_metrics_exporter(**kwargs):
+    # Workers run the solo pool, so the process serving metrics is the one running tasks
+    start_exporter(WORKER_METRICS_PORT)
+
+
+def shard_key(target):
+    """
+    Key targets are sharded and scheduled by: the URL hash, so targets sharing a URL land in the
+    same shard and can share a probe. Rows created before url_hash existed fall back to their id.
+    """
+    return func.coalesce(target.url_hash, target.id)
+
+
 @app.task
-def monitor_endpoint():
+def monitor_endpoint(target_ids: Optional[List[int]] = None, shard_keys: Optional[List[int]] = None,
+                     enqueued_at: Optional[float] = None):
+    """
+    Start a monitoring cycle by fanning targets out to shard tasks.
+
+    With target_ids only those targets are checked (the ones the scheduler found due, along
+    with their shard keys), otherwise every active target is spread over MONITOR_SHARDS shards.
+    enqueued_at is the epoch time the scheduler sent the task, used to measure queue lag.
+
+    The whole cycle gets MONITOR_CYCLE_BUDGET_SECONDS from when it was enqueued: every shard is
+    handed the same deadline, so shards that wait in the queue behind others get what is left of
+    it, and a cycle that started late still ends before its targets are due again.
+    """
+    started_at = datetime.datetime.utcnow()
+    deadline_at = min(time.time(), enqueued_at or time.time()) + MONITOR_CYCLE_BUDGET_SECONDS
+    if enqueued_at is not None:
+        QUEUE_LAG.observe(max(0.0, time.time() - enqueued_at))
+
+    if target_ids is None:
+        logger.info(f"Initializing endpoint monitoring at {started_at} across {MONITOR_SHARDS} shards")
+        shards = [monitor_shard.s(shard, MONITOR_SHARDS, deadline_at=deadline_at) for shard in range(MONITOR_SHARDS)]
+    else:
+        shard_ids = defaultdict(list)
+        for target_id, key in zip(target_ids, shard_keys or target_ids):
+            shard_ids[key % MONITOR_SHARDS].append(target_id)
+        shards = [monitor_shard.s(shard, MONITOR_SHARDS, ids, deadline_at=deadline_at)
+                  for shard, ids in shard_ids.items()]
+
+    if not shards:
+        return None
+
+    return chord(shards)(collect_cycle_stats.s(started_at.isoformat())).id
+
+
+def target_snapshot(db: Session, shard_index: int, shard_count: int, target_ids: Optional[List[int]] = None):
+    """
+    Column-only rows of the shard's active targets and their owner's email and name, loaded
+    with one joined query and streamed in chunks of TARGET_SNAPSHOT_CHUNK rows. Rows are
+    ordered by URL hash so targets sharing a URL end up in the same chunk.
+    """
+    query = select(
+        PingTarget.id,
+        PingTarget.name,
+        PingTarget.url,
+        PingTarget.send_email,
+        PingTarget.is_down,
+        PingTarget.user_id,
+        PingTarget.url_hash,
+        User.email.label("user_email"),
+        User.name.label("user_name"),
+    ).join(User, User.id == PingTarget.user_id).where(
+        PingTarget.is_active == True,
+        shard_key(PingTarget) % shard_count == shard_index
+    ).order_by(PingTarget.url_hash, PingTarget.id)
+    if target_ids is not None:
+        query = query.where(PingTarget.id.in_(target_ids))
+
+    return db.execute(query.execution_options(yield_per=TARGET_SNAPSHOT_CHUNK)).partitions()
+
+
+@app.task
+def monitor_shard(shard_index: int, shard_count: int, target_ids: Optional[List[int]] = None,
+                  deadline_at: Optional[float] = None):
+    """
+    Probe the active targets whose shard key falls into this shard and commit their results.
+
+    Targets are probed one snapshot chunk at a time, so memory stays flat however many
+    targets the shard holds. Each unique URL is requested once and its result is written to
+    every target monitoring it; whether to alert is still decided per target.
+
+    deadline_at is the epoch time the cycle's budget runs out, set by monitor_endpoint; a shard
+    run on its own gets a full MONITOR_CYCLE_BUDGET_SECONDS. Probes still running at the deadline
+    are cancelled and the remaining targets are deferred to their next check.
+    """
+    started_at = datetime.datetime.utcnow()
+    # Converted to the monotonic clock once, so wall clock adjustments during the shard don't move it
+    budget = MONITOR_CYCLE_BUDGET_SECONDS if deadline_at is None else deadline_at - time.time()
+    deadline = time.monotonic() + budget
+    stats = {"shard": shard_index, "targets": 0, "requests": 0, "probed": 0, "down": 0, "deferred": 0, "alerts": [], "error": None}
+
+    db = SessionLocal()
+    writer = PingLogWriter()
     try:
-        db = SessionLocal()
-        print(f"Initializing endpoint monitoring at {datetime.datetime.utcnow()}")
-        targets = db.query(PingTarget).filter(PingTarget.is_active == True).all()
-
-        for target in targets:
-            start_time = datetime.datetime.utcnow()
-            response = requests.head(target.url) # Pings the URL with a HEAD request
-            status_code = response.status_code
-            end_time = datetime.datetime.utcnow()
-            response_time = (end_time - start_time).total_seconds() * 1000  # Convert to milliseconds
-
-            print(
-                f"✅ Endpoint: {target.name}, URL: {target.url}, Status Code: {status_code}, Response Time: {response_time} ms")
-
-            log_entry = PingLogs(
-                target_id=target.id,
-                status_code=status_code,
-                response_time=int(response_time)
-            )
-            db.add(log_entry)
-
-            if not (200 <= status_code < 300):
-                if target.send_email and target.is_down is False:
-                    send_mail(user_id=target.user.id,
-                              target_id=target.id,
-                              email=target.user.email,
-                              endpoint_name=target.name,
-                              user_name=target.user.name,
-                              endpoint_url=target.url,
-                              timestamp=datetime.datetime.now(),
-                              status_code=status_code,
-                              db=db)
-                target.is_down = True
-            else:
-                target.is_down = False
-
-        db.commit()
+        groups_by_id = {}
+        alerts = stats["alerts"]
+
+        # Runs on the probe event loop, so it must not do I/O: targets are column-only snapshot rows
+        # with the owner's email and name already joined in, and nothing here can lazy-load.
+        def record(result):
+            group = groups_by_id[result.target_id]
+            status_code = result.status_code
+            is_down = is_failure(status_code)
+            stats["requests"] += 1
+            PROBE_DURATION.labels(probe_outcome(status_code)).observe(result.response_time / 1000)
+
+            for target in group.targets:
+                stats["probed"] += 1
+                logger.info(f"Endpoint: {target.name}, URL: {target.url}, Status Code: {status_code}, "
+                            f"Response Time: {result.response_time} ms",
+                            extra=sampled("probe_result", target_id=target.id, status_code=status_code,
+                                          response_time=result.response_time))
+
+                writer.add(target.id, status_code, result.response_time, result.checked_at,
+                           is_down=is_down, was_down=target.is_down, user_id=target.user_id, timings=result.timings())
+
+                if is_down:
+                    stats["down"] += 1
+                    if target.send_email and target.is_down is False:
+                        alerts.append({
+                            "user_id": target.user_id,
+                            "target_id": target.id,
+                            "email": target.user_email,
+                            "user_name": target.user_name,
+                            "endpoint_name": target.name,
+                            "endpoint_url": target.url,
+                            "timestamp": str(datetime.datetime.now()),
+                            "status_code": status_code,
+                        })
+
+        for chunk in target_snapshot(db, shard_index, shard_count, target_ids):
+            groups_by_id = {group.id: group for group in plan_probes(chunk)}
+            stats["targets"] += len(chunk)
+            if time.monotonic() >= deadline:
+                stats["deferred"] += len(chunk)
+                continue
+
+            results = run_probes(groups_by_id.values(), deadline=deadline, on_result=record)
+            stats["deferred"] += sum(len(group.targets) for group_id, group in groups_by_id.items()
+                                     if group_id not in results)
+
+        if stats["deferred"]:
+            TARGETS_DEFERRED.inc(stats["deferred"])
+            logger.warning(f"Shard {shard_index}/{shard_count} ran out of the cycle's {MONITOR_CYCLE_BUDGET_SECONDS}s "
+                           f"budget, {stats['deferred']} targets deferred")
 
     except Exception as e:
-        print(f"❌ ERROR: {str(e)}")
+        logger.error(f"Shard {shard_index}/{shard_count} failed: {str(e)}")
+        db.rollback()
+        stats["error"] = str(e)
+
+    finally:
+        writer.close()
+        db.close()
+
+    stats["writer"] = writer.stats()
+    stats["duration_ms"] = int((datetime.datetime.utcnow() - started_at).total_seconds() * 1000)
+    SHARD_DURATION.observe(stats["duration_ms"] / 1000)
+    return stats
+
+
+@app.task(bind=True, queue="email", max_retries=EMAIL_MAX_RETRIES)
+def send_alerts(self, alerts: List[Dict]):
+    """
+    Send alert emails, one per user, in provider batches and record each alerted target.
+
+    Batches are committed as they succeed, so a retry only resends the alerts that have not
+    gone out yet. Retries back off exponentially on network errors, rate limits and 5xx.
+    """
+    messages = render_digests(alerts)
+
+    db = SessionLocal()
+    try:
+        for start in range(0, len(messages), EMAIL_BATCH_SIZE):
+            batch = messages[start:start + EMAIL_BATCH_SIZE]
+            send_started = time.perf_counter()
+            try:
+                send_batch(batch)
+            except EmailSendError as e:
+                ALERT_SEND_DURATION.labels("failed").observe(time.perf_counter() - send_started)
+                ALERT_EMAILS.labels("failed").inc(len(batch))
+                countdown = EMAIL_RETRY_BACKOFF_SECONDS * 2 ** self.request.retries
+                logger.error(f"Sending {len(messages) - start} alert emails failed, retrying in {countdown}s: {str(e)}")
+                remaining = [alert for message in messages[start:] for alert in message["alerts"]]
+                raise self.retry(args=[remaining], countdown=countdown, exc=e)
+
+            ALERT_SEND_DURATION.labels("sent").observe(time.perf_counter() - send_started)
+            ALERT_EMAILS.labels("sent").inc(len(batch))
+
+            record_sent(db, batch)
+            db.commit()
+
+    except Retry:
+        raise
+
+    except Exception as e:
+        logger.error(f"Sending alert emails failed: {str(e)}")
+        db.rollback()
+        raise
+
+    finally:
+        db.close()
+
+    return len(messages)
+
+
+@app.task(queue="email")
+def flush_alerts():
+    """
+    End of a coalescing window: send everything buffered during it.
+    """
+    alerts = alert_buffer.drain()
+    if alerts:
+        send_alerts.delay(alerts)
+    return len(alerts)
+
+
+def dispatch_alerts(alerts: List[Dict]):
+    """
+    Hand a cycle's alerts to the email queue.
+
+    Without a digest window they are sent right away, grouped per user within the cycle.
+    Otherwise they are buffered so an outage spread over several cycles still ends up in one
+    digest per user, sent ALERT_DIGEST_WINDOW_SECONDS after the first alert of the window.
+    """
+    if ALERT_DIGEST_WINDOW_SECONDS <= 0 or alert_buffer is None:
+        send_alerts.delay(alerts)
+    elif alert_buffer.add(alerts, ALERT_DIGEST_WINDOW_SECONDS):
+        flush_alerts.apply_async(countdown=ALERT_DIGEST_WINDOW_SECONDS)
+
+
+def sweep_alerts():
+    """
+    Schedule a flush for alerts whose flush task was lost, once their window's flag has expired.
+    """
+    if ALERT_DIGEST_WINDOW_SECONDS <= 0 or alert_buffer is None:
+        return
+
+    try:
+        if alert_buffer.claim_stranded(ALERT_DIGEST_WINDOW_SECONDS):
+            logger.warning("Found buffered alerts without a pending flush, flushing them now")
+            flush_alerts.delay()
+
+    except Exception as e:
+        logger.error(f"Failed to sweep buffered alerts: {str(e)}")
+
+
+@app.task
+def collect_cycle_stats(shard_stats: List[Dict], started_at: str):
+    """
+    Chord callback: aggregate the per-shard results into statistics for the whole cycle
+    and dispatch the cycle's alerts.
+    """
+    alerts = [alert for stats in shard_stats for alert in stats["alerts"]]
+    if alerts:
+        # Provider latency stays off the probe path: alerts are sent by the email queue
+        try:
+            dispatch_alerts(alerts)
+        except Exception as e:
+            logger.error(f"Dispatching {len(alerts)} alerts failed: {str(e)}")
+
+    cycle_stats = {
+        "shards": len(shard_stats),
+        "failed_shards": sum(1 for stats in shard_stats if stats["error"]),
+        "targets": sum(stats["targets"] for stats in shard_stats),
+        "requests": sum(stats["requests"] for stats in shard_stats),
+        "probed": sum(stats["probed"] for stats in shard_stats),
+        "down": sum(stats["down"] for stats in shard_stats),
+        "deferred": sum(stats["deferred"] for stats in shard_stats),
+        "alerts": len(alerts),
+        "rows_written": sum(stats["writer"]["rows_written"] for stats in shard_stats),
+        "rows_failed": sum(stats["writer"]["rows_failed"] for stats in shard_stats),
+        "slowest_flush_ms": max((stats["writer"]["max_flush_ms"] for stats in shard_stats), default=0),
+        "slowest_shard_ms": max((stats["duration_ms"] for stats in shard_stats), default=0),
+        "cycle_ms": int((datetime.datetime.utcnow() - datetime.datetime.fromisoformat(started_at)).total_seconds() * 1000),
+    }
+
+    CYCLE_DURATION.observe(cycle_stats["cycle_ms"] / 1000)
+
+    logger.info(f"Monitoring cycle finished: {cycle_stats}")
+    return cycle_stats
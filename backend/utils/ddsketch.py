@@ -0,0 +1,83 @@
+import math
+import struct
+from collections import defaultdict
+from typing import Dict, Optional
+
+SKETCH_RELATIVE_ACCURACY = 0.01
+
+_HEADER = struct.Struct("<dI")  # relative accuracy, zero count
+_BIN = struct.Struct("<iI")  # bin index, count
+
+
+class DDSketch:
+    """
+    Mergeable quantile sketch with relative-error guarantees (DDSketch).
+
+    Positive values go into logarithmically sized bins, so every quantile is returned within
+    `relative_accuracy` of the true value whatever the distribution. Two sketches with the same
+    accuracy merge by adding their bin counts, which makes per-bucket sketches combinable into
+    any larger window. Values <= 0 are counted separately.
+    """
+
+    def __init__(self, relative_accuracy: float = SKETCH_RELATIVE_ACCURACY):
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+
+        self.bins: Dict[int, int] = defaultdict(int)
+        self.zero_count = 0
+
+    @property
+    def count(self) -> int:
+        return self.zero_count + sum(self.bins.values())
+
+    def add(self, value: float, count: int = 1):
+        if value <= 0:
+            self.zero_count += count
+        else:
+            self.bins[math.ceil(math.log(value) / self._log_gamma)] += count
+
+    def merge(self, other: "DDSketch"):
+        if other.relative_accuracy != self.relative_accuracy:
+            raise ValueError("Cannot merge sketches with different relative accuracy")
+
+        self.zero_count += other.zero_count
+        for index, count in other.bins.items():
+            self.bins[index] += count
+
+    def _value(self, index: int) -> float:
+        # Midpoint of the bin (gamma^(index-1), gamma^index] in relative terms
+        return 2 * self.gamma ** index / (self.gamma + 1)
+
+    def quantile(self, q: float) -> Optional[float]:
+        """
+        Value at quantile q (0 <= q <= 1), or None for an empty sketch.
+        """
+        count = self.count
+        if count == 0:
+            return None
+
+        rank = q * (count - 1)
+        if rank < self.zero_count:
+            return 0.0
+
+        seen = self.zero_count
+        for index in sorted(self.bins):
+            seen += self.bins[index]
+            if seen > rank:
+                return self._value(index)
+        return self._value(max(self.bins))
+
+    def to_bytes(self) -> bytes:
+        return _HEADER.pack(self.relative_accuracy, self.zero_count) + b"".join(
+            _BIN.pack(index, count) for index, count in sorted(self.bins.items()) if count
+        )
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "DDSketch":
+        relative_accuracy, zero_count = _HEADER.unpack_from(data)
+        sketch = cls(relative_accuracy)
+        sketch.zero_count = zero_count
+        for index, count in _BIN.iter_unpack(data[_HEADER.size:]):
+            sketch.bins[index] = count
+        return sketch
@@ -1,7 +1,30 @@
-from jinja2 import Template
+from typing import Dict, Iterable, List
 
-def dynamic_content(content, values):
-    template = Template(content)
-    dynamic_content = template.render(**values)
+from jinja2 import Environment, Template
+
+from utils import email_format
+
+environment = Environment()
+
+# Templates compiled once at import, looked up by name
+templates: Dict[str, Template] = {}
+
+
+def register_template(name: str, content: str):
+    templates[name] = environment.from_string(content)
+
+
+register_template("alert_subject", email_format.subject)
+register_template("alert_html", email_format.html)
+register_template("digest_subject", email_format.digest_subject)
+register_template("digest_html", email_format.digest_html)
+
+
+def render(name: str, values: Dict) -> str:
+    return templates[name].render(**values)
+
+
+def render_many(name: str, values_list: Iterable[Dict]) -> List[str]:
+    template = templates[name]
+    return [template.render(**values) for values in values_list]
 
-    return dynamic_content
\ No newline at end of file
@@ -1,6 +1,8 @@
 subject = "🚨 Endpoint Down Alert: {{ endpoint_name }}"
 
-html = ("<html>"
+digest_subject = "🚨 Endpoint Down Alert: {{ alerts|length }} endpoints down"
+
+head = ("<html>"
         "<head>"
         "  <meta charset='UTF-8'>"
         "  <meta name='viewport' content='width=device-width, initial-scale=1.0'>"
@@ -49,7 +51,9 @@ html = ("<html>"
         "      color: #999999;"
         "    }"
         "  </style>"
-        "</head>"
+        "</head>")
+
+html = (head +
         "<body>"
         "  <div class='container'>"
         "    <h1>🚨 Endpoint Down Alert</h1>"
@@ -66,3 +70,25 @@ html = ("<html>"
         "  </div>"
         "</body>"
         "</html>")
+
+
+digest_html = (head +
+               "<body>"
+               "  <div class='container'>"
+               "    <h1>🚨 Endpoint Down Alert</h1>"
+               "    <p>Hello {{ user_name }},</p>"
+               "    <p>We detected that {{ alerts|length }} of your monitored endpoints are currently unreachable. Please see the details below:</p>"
+               "    {% for alert in alerts %}"
+               "    <div class='alert-info'>"
+               "      <p><strong>📛 Endpoint:</strong> {{ alert.endpoint_name }}</p>"
+               "      <p><strong>🔗 URL:</strong> <a href='{{ alert.endpoint_url }}'>{{ alert.endpoint_url }}</a></p>"
+               "      <p><strong>⏱️ Time:</strong> {{ alert.timestamp }}</p>"
+               "      <p><strong>📄 Status:</strong> Failed (HTTP {{ alert.status_code }})</p>"
+               "    </div>"
+               "    {% endfor %}"
+               "    <p>We will continue monitoring and notify you of any further changes.</p>"
+               "    <p>Regards,<br>PingBot Team</p>"
+               "    <div class='footer'>This is an automated alert from PingBot</div>"
+               "  </div>"
+               "</body>"
+               "</html>")
@@ -0,0 +1,102 @@
+import threading
+import time
+from typing import Any, Dict, Optional
+
+import httpx
+import jwt
+from jwt.algorithms import RSAAlgorithm
+
+from logger import logger
+
+
+class JWKSCache:
+    """
+    Caches the signing keys of a JWKS endpoint so tokens can be verified locally.
+
+    Known keys are always served from memory. Once the key set is older than `refresh_seconds`
+    it is refreshed on a background thread while the cached keys keep being used, so a slow or
+    unavailable identity provider never delays a request. A token signed with an unknown kid
+    (key rotation) triggers a blocking refresh, at most once per `min_refresh_seconds`.
+    """
+
+    def __init__(self, url: str, headers: Optional[Dict[str, str]] = None, refresh_seconds: float = 3600,
+                 min_refresh_seconds: float = 30, timeout: float = 5):
+        self.url = url
+        self.headers = headers or {}
+        self.refresh_seconds = refresh_seconds
+        self.min_refresh_seconds = min_refresh_seconds
+        self.timeout = timeout
+
+        self._keys: Dict[str, Any] = {}
+        self._fetched_at = 0.0
+        self._attempted_at = 0.0
+        self._lock = threading.Lock()
+        self._refreshing = False
+
+    def set_keys(self, jwks: Dict):
+        keys = {}
+        for jwk in jwks.get("keys", []):
+            if jwk.get("kty") == "RSA" and jwk.get("kid"):
+                keys[jwk["kid"]] = RSAAlgorithm.from_jwk(jwk)
+
+        self._keys = keys
+        self._fetched_at = time.monotonic()
+
+    def refresh(self):
+        with self._lock:
+            if time.monotonic() - self._attempted_at < self.min_refresh_seconds:
+                return
+            self._attempted_at = time.monotonic()
+
+        try:
+            response = httpx.get(self.url, headers=self.headers, timeout=self.timeout)
+            response.raise_for_status()
+            self.set_keys(response.json())
+
+        except Exception as e:
+            logger.error(f"Failed to refresh JWKS from {self.url}: {str(e)}")
+
+    def _refresh_in_background(self):
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+
+        def run():
+            try:
+                self.refresh()
+            finally:
+                self._refreshing = False
+
+        threading.Thread(target=run, name="jwks-refresh", daemon=True).start()
+
+    def get_key(self, kid: str):
+        key = self._keys.get(kid)
+        if key is not None:
+            if time.monotonic() - self._fetched_at > self.refresh_seconds:
+                self._refresh_in_background()
+            return key
+
+        self.refresh()
+        return self._keys.get(kid)
+
+    def verify(self, token: str, authorized_parties=None, leeway: float = 5) -> Dict[str, Any]:
+        """
+        Verify an RS256 token against the cached keys and return its claims.
+
+        Raises jwt.InvalidTokenError if the token is invalid, expired or from an unauthorized party.
+        """
+        kid = jwt.get_unverified_header(token).get("kid")
+        key = self.get_key(kid) if kid else None
+        if key is None:
+            # An InvalidTokenError like any other bad token: callers treat it as unauthenticated, not as a failure
+            raise jwt.InvalidTokenError(f"No signing key found for kid {kid}")
+
+        claims = jwt.decode(token, key, algorithms=["RS256"], leeway=leeway,
+                            options={"verify_aud": False, "require": ["exp", "sub"]})
+
+        authorized_party = claims.get("azp")
+        if authorized_parties and authorized_party and authorized_party not in authorized_parties:
+            raise jwt.InvalidTokenError(f"Unauthorized party: {authorized_party}")
+
+        return claims
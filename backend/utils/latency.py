@@ -0,0 +1,81 @@
+import datetime
+from collections import defaultdict
+from typing import Dict, Iterable, Tuple
+
+from sqlalchemy import insert, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from models import PingLatencyHourly
+from utils.ddsketch import DDSketch
+from utils.probe import UNREACHABLE_STATUS_CODE
+from utils.rollups import hour_bucket
+
+
+def _sketch_logs(logs: Iterable[Dict]) -> Dict[Tuple[int, datetime.datetime], DDSketch]:
+    sketches = defaultdict(DDSketch)
+    for log in logs:
+        # Unreachable probes carry how long we waited, not how fast the target answered
+        if log["status_code"] == UNREACHABLE_STATUS_CODE:
+            continue
+        sketches[(log["target_id"], hour_bucket(log["created_at"]))].add(log["response_time"])
+    return sketches
+
+
+def upsert_latency(db: Session, logs: Iterable[Dict]):
+    """
+    Merge a batch of ping logs into the hourly latency sketches. Runs in the caller's transaction.
+
+    Sketches cannot be merged in SQL, so this is a read-modify-write: missing rows are created
+    empty first, then every affected row is read with FOR UPDATE (a no-op on SQLite), merged and
+    written back, so concurrent writers never overwrite each other's counts.
+
+    Databases without INSERT ... ON CONFLICT skip the empty rows and insert the missing buckets
+    after the locked read instead, like the rollup fallback: two writers creating the same
+    bucket at once would conflict, but every target is written by one shard of one cycle at a time.
+    """
+    sketches = _sketch_logs(logs)
+    if not sketches:
+        return
+
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        stmt = postgresql.insert(PingLatencyHourly)
+    elif dialect == "sqlite":
+        stmt = sqlite.insert(PingLatencyHourly)
+    else:
+        stmt = None
+
+    # Sorted so concurrent writers lock rows in the same order
+    keys = sorted(sketches)
+    if stmt is not None:
+        empty = DDSketch().to_bytes()
+        db.execute(stmt.on_conflict_do_nothing(), [
+            {"target_id": target_id, "bucket_start": bucket_start, "sketch": empty} for target_id, bucket_start in keys
+        ])
+
+    rows = db.execute(
+        select(PingLatencyHourly.target_id, PingLatencyHourly.bucket_start, PingLatencyHourly.sketch)
+        .where(PingLatencyHourly.target_id.in_({target_id for target_id, _ in keys}),
+               PingLatencyHourly.bucket_start.in_({bucket_start for _, bucket_start in keys}))
+        .order_by(PingLatencyHourly.target_id, PingLatencyHourly.bucket_start)
+        .with_for_update()
+    ).all()
+
+    merged = []
+    for target_id, bucket_start, data in rows:
+        sketch = sketches.pop((target_id, bucket_start), None)
+        if sketch is None:
+            continue
+        stored = DDSketch.from_bytes(data)
+        stored.merge(sketch)
+        merged.append({"target_id": target_id, "bucket_start": bucket_start, "sketch": stored.to_bytes()})
+
+    if merged:
+        db.execute(update(PingLatencyHourly), merged)
+    # Only left without ON CONFLICT: buckets that did not exist yet
+    if sketches:
+        db.execute(insert(PingLatencyHourly), [
+            {"target_id": target_id, "bucket_start": bucket_start, "sketch": sketch.to_bytes()}
+            for (target_id, bucket_start), sketch in sorted(sketches.items())
+        ])
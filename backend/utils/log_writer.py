@@ -0,0 +1,153 @@
+import datetime
+import os
+import threading
+import time
+from typing import Dict, List, Optional, Set
+
+from dotenv import load_dotenv
+from sqlalchemy import insert, update
+
+from db import SessionLocal
+from logger import logger
+from models import PingLogs, PingTarget
+from utils.cache import result_cache
+from utils.latency import upsert_latency
+from utils.metrics import DB_FLUSH_DURATION, PING_LOGS_WRITTEN
+from utils.rollups import upsert_rollups
+
+load_dotenv()
+
+PING_LOG_FLUSH_ROWS = int(os.getenv("PING_LOG_FLUSH_ROWS") or 500)
+PING_LOG_FLUSH_SECONDS = float(os.getenv("PING_LOG_FLUSH_SECONDS") or 2)
+
+
+class PingLogWriter:
+    """
+    Buffers probe results and writes them from a background thread.
+
+    A flush happens once PING_LOG_FLUSH_ROWS results are buffered or PING_LOG_FLUSH_SECONDS
+    have passed, whichever comes first. Each flush bulk-inserts the PingLogs rows, folds them
+    into the uptime rollups and latency sketches, bulk-updates the is_down flags that changed, and commits in its
+    own short transaction, so a failure only loses the rows of that one batch. Once committed,
+    the cached API results of the affected users are invalidated.
+    """
+
+    def __init__(self, flush_rows: int = PING_LOG_FLUSH_ROWS, flush_seconds: float = PING_LOG_FLUSH_SECONDS,
+                 session_factory=SessionLocal):
+        self.flush_rows = flush_rows
+        self.flush_seconds = flush_seconds
+        self._session_factory = session_factory
+
+        self._logs: List[Dict] = []
+        self._states: Dict[int, bool] = {}  # target_id -> is_down, only for targets whose state changed
+        self._users: Set[str] = set()  # owners of the buffered targets
+        self._condition = threading.Condition()
+        self._closed = False
+
+        self.rows_written = 0
+        self.rows_failed = 0
+        self.flushes = 0
+        self.flush_seconds_total = 0.0
+        self.last_flush_ms = 0.0
+        self.max_flush_ms = 0.0
+
+        self._thread = threading.Thread(target=self._run, name="ping-log-writer", daemon=True)
+        self._thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def add(self, target_id: int, status_code: int, response_time: int, checked_at: datetime.datetime,
+            is_down: bool, was_down: bool, user_id: Optional[str] = None,
+            timings: Optional[Dict[str, Optional[int]]] = None):
+        timings = timings or {}
+        with self._condition:
+            self._logs.append({
+                "target_id": target_id,
+                "status_code": status_code,
+                "response_time": response_time,
+                "dns_time": timings.get("dns_time"),
+                "connect_time": timings.get("connect_time"),
+                "tls_time": timings.get("tls_time"),
+                "ttfb_time": timings.get("ttfb_time"),
+                "created_at": checked_at,
+            })
+            if is_down != was_down:
+                self._states[target_id] = is_down
+            if user_id is not None:
+                self._users.add(user_id)
+
+            if len(self._logs) >= self.flush_rows:
+                self._condition.notify()
+
+    def close(self):
+        """
+        Flush whatever is still buffered and stop the writer thread.
+        """
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+        self._thread.join()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: self._closed or len(self._logs) >= self.flush_rows,
+                                         timeout=self.flush_seconds)
+                logs, self._logs = self._logs, []
+                states, self._states = self._states, {}
+                users, self._users = self._users, set()
+                closed = self._closed
+
+            if logs or states:
+                self._write(logs, states, users)
+
+            if closed:
+                return
+
+    def _write(self, logs: List[Dict], states: Dict[int, bool], users: Set[str]):
+        start_time = time.perf_counter()
+        db = self._session_factory()
+        try:
+            if logs:
+                db.execute(insert(PingLogs), logs)
+                upsert_rollups(db, logs)
+                upsert_latency(db, logs)
+            if states:
+                db.execute(update(PingTarget), [
+                    {"id": target_id, "is_down": is_down} for target_id, is_down in states.items()
+                ])
+            db.commit()
+            self.rows_written += len(logs)
+            PING_LOGS_WRITTEN.labels("written").inc(len(logs))
+            result_cache.bump(users)
+
+        except Exception as e:
+            logger.error(f"Failed to write {len(logs)} ping logs: {str(e)}")
+            db.rollback()
+            self.rows_failed += len(logs)
+            PING_LOGS_WRITTEN.labels("failed").inc(len(logs))
+
+        finally:
+            db.close()
+
+        elapsed = time.perf_counter() - start_time
+        DB_FLUSH_DURATION.observe(elapsed)
+        self.flushes += 1
+        self.flush_seconds_total += elapsed
+        self.last_flush_ms = elapsed * 1000
+        self.max_flush_ms = max(self.max_flush_ms, self.last_flush_ms)
+
+    def stats(self) -> Dict:
+        return {
+            "rows_written": self.rows_written,
+            "rows_failed": self.rows_failed,
+            "flushes": self.flushes,
+            "rows_per_second": round(self.rows_written / self.flush_seconds_total, 2) if self.flush_seconds_total else 0.0,
+            "avg_flush_ms": round(self.flush_seconds_total * 1000 / self.flushes, 2) if self.flushes else 0.0,
+            "last_flush_ms": round(self.last_flush_ms, 2),
+            "max_flush_ms": round(self.max_flush_ms, 2),
+        }
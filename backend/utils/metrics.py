@@ -0,0 +1,105 @@
+import os
+import time
+
+from dotenv import load_dotenv
+from prometheus_client import Counter, Histogram, start_http_server
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+load_dotenv()
+
+# Metrics are served on their own ports, never on the public API port; 0 disables an exporter.
+# Give each process on a host its own port, and don't publish these ports outside the private network.
+API_METRICS_PORT = int(os.getenv("API_METRICS_PORT") or 0)
+WORKER_METRICS_PORT = int(os.getenv("WORKER_METRICS_PORT") or 0)
+METRICS_ADDRESS = os.getenv("METRICS_ADDRESS") or "0.0.0.0"
+
+# Buckets in seconds. Probes and cycles span milliseconds to the cycle budget, queries are much faster.
+PROBE_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+CYCLE_BUCKETS = (0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+QUERY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1, 5)
+
+CYCLE_DURATION = Histogram("pingbot_cycle_duration_seconds", "Monitoring cycle duration, from dispatch to the last shard",
+                           buckets=CYCLE_BUCKETS)
+SHARD_DURATION = Histogram("pingbot_shard_duration_seconds", "Duration of one monitoring shard", buckets=CYCLE_BUCKETS)
+QUEUE_LAG = Histogram("pingbot_queue_lag_seconds", "Time between the scheduler enqueueing a cycle and it starting",
+                      buckets=CYCLE_BUCKETS)
+PROBE_DURATION = Histogram("pingbot_probe_duration_seconds", "Probe response time, including confirmation retries",
+                           ["outcome"], buckets=PROBE_BUCKETS)
+TARGETS_DEFERRED = Counter("pingbot_targets_deferred_total", "Targets skipped because their shard ran out of budget")
+DB_FLUSH_DURATION = Histogram("pingbot_db_flush_seconds", "Duration of one ping log write batch", buckets=QUERY_BUCKETS)
+PING_LOGS_WRITTEN = Counter("pingbot_ping_logs_total", "Ping logs written", ["result"])
+ALERT_SEND_DURATION = Histogram("pingbot_alert_send_seconds", "Duration of one alert email batch request",
+                                ["result"], buckets=PROBE_BUCKETS)
+ALERT_EMAILS = Counter("pingbot_alert_emails_total", "Alert emails handed to the provider", ["result"])
+HTTP_REQUEST_DURATION = Histogram("pingbot_http_request_duration_seconds", "API request latency",
+                                  ["method", "route", "status"], buckets=PROBE_BUCKETS)
+SQL_QUERIES = Counter("pingbot_sql_queries_total", "SQL statements executed", ["engine"])
+SQL_QUERY_DURATION = Histogram("pingbot_sql_query_duration_seconds", "SQL statement execution time", ["engine"],
+                               buckets=QUERY_BUCKETS)
+
+
+def probe_outcome(status_code: int) -> str:
+    if status_code == 0:
+        return "unreachable"
+    return "up" if 200 <= status_code < 300 else "down"
+
+
+def instrument_engine(engine: Engine, name: str):
+    """
+    Count and time every statement run through `engine`. Pass `async_engine.sync_engine` for async engines.
+    """
+    queries = SQL_QUERIES.labels(name)
+    duration = SQL_QUERY_DURATION.labels(name)
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        context._query_started = time.perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        queries.inc()
+        duration.observe(time.perf_counter() - context._query_started)
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware timing every HTTP request, labelled by route template so paths
+    with ids or query strings don't create a series each.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        start_time = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            # The router stores the matched route in the scope
+            route = scope.get("route")
+            HTTP_REQUEST_DURATION.labels(scope["method"], getattr(route, "path", "unmatched"),
+                                         str(status_code)).observe(time.perf_counter() - start_time)
+
+
+def start_exporter(port: int):
+    """
+    Serve this process's metrics on `port` from a background thread. Returns the server, or
+    None when the port is 0.
+    """
+    if not port:
+        return None
+    server, _ = start_http_server(port, addr=METRICS_ADDRESS)
+    return server
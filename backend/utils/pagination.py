@@ -0,0 +1,23 @@
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from datetime import datetime
+
+from fastapi import HTTPException
+from starlette import status
+
+
+def encode_cursor(created_at: datetime, row_id: int) -> str:
+    """
+    Opaque keyset cursor for lists ordered newest first by (created_at, id).
+    """
+    return urlsafe_b64encode(f"{created_at.isoformat()}|{row_id}".encode()).decode()
+
+
+def decode_cursor(cursor: str):
+    try:
+        created_at, row_id = urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(created_at), int(row_id)
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor"
+        )
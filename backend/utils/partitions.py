@@ -0,0 +1,114 @@
+import datetime
+import os
+import re
+
+from dotenv import load_dotenv
+from sqlalchemy import delete, text
+from sqlalchemy.engine import Connection, Engine
+
+from logger import logger
+from models import PingLogs
+
+load_dotenv()
+
+PING_LOG_RETENTION_DAYS = max(int(os.getenv("PING_LOG_RETENTION_DAYS") or 90), 2)
+PING_LOG_PARTITIONS_AHEAD = int(os.getenv("PING_LOG_PARTITIONS_AHEAD") or 7)
+
+TABLE = PingLogs.__tablename__
+PARTITION_NAME = re.compile(rf"^{TABLE}_p(\d{{8}})$")
+
+
+def _partition_name(day: datetime.date) -> str:
+    return f"{TABLE}_p{day:%Y%m%d}"
+
+
+def is_partitioned(connection: Connection) -> bool:
+    """
+    Whether ping_logs is a partitioned table. Tables created before partitioning stay plain
+    until utils.schema converts them.
+    """
+    return connection.execute(text(
+        "SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(:table)"
+    ), {"table": TABLE}).first() is not None
+
+
+def create_partitions(connection: Connection, first_day: datetime.date, last_day: datetime.date):
+    """
+    Create the default partition and the daily partitions from `first_day` to `last_day`.
+    """
+    connection.execute(text(f"CREATE TABLE IF NOT EXISTS {TABLE}_default PARTITION OF {TABLE} DEFAULT"))
+
+    day = first_day
+    while day <= last_day:
+        connection.execute(text(
+            f"CREATE TABLE IF NOT EXISTS {_partition_name(day)} PARTITION OF {TABLE} "
+            f"FOR VALUES FROM ('{day.isoformat()}') TO ('{(day + datetime.timedelta(days=1)).isoformat()}')"
+        ))
+        day += datetime.timedelta(days=1)
+
+
+def ensure_partitions(engine: Engine, today: datetime.date = None, days_ahead: int = PING_LOG_PARTITIONS_AHEAD):
+    """
+    Create the daily ping_logs partitions from today up to `days_ahead` days out, plus a
+    default partition that catches rows if maintenance ever falls behind. No-op outside Postgres,
+    and skipped with a warning while ping_logs is still a plain table.
+    """
+    if engine.dialect.name != "postgresql":
+        return
+
+    today = today or datetime.datetime.utcnow().date()
+    with engine.begin() as connection:
+        if not is_partitioned(connection):
+            logger.warning(f"{TABLE} is not partitioned, skipping partition maintenance until it is converted")
+            return
+
+        create_partitions(connection, today, today + datetime.timedelta(days=days_ahead))
+
+
+def drop_expired_partitions(engine: Engine, today: datetime.date = None,
+                            retention_days: int = PING_LOG_RETENTION_DAYS) -> int:
+    """
+    Drop every daily partition that ends on or before the retention cutoff.
+
+    Whole partitions are dropped instead of deleting rows, so pruning leaves no dead tuples to
+    vacuum. Outside Postgres, or while ping_logs is not partitioned yet, expired rows are deleted
+    instead.
+    Returns the number of partitions (or rows) removed.
+    """
+    today = today or datetime.datetime.utcnow().date()
+    cutoff = today - datetime.timedelta(days=retention_days)
+
+    with engine.begin() as connection:
+        if engine.dialect.name != "postgresql" or not is_partitioned(connection):
+            result = connection.execute(delete(PingLogs).where(PingLogs.created_at < cutoff))
+            return result.rowcount
+
+        partitions = connection.execute(text(
+            "SELECT child.relname FROM pg_inherits "
+            "JOIN pg_class parent ON pg_inherits.inhparent = parent.oid "
+            "JOIN pg_class child ON pg_inherits.inhrelid = child.oid "
+            "WHERE parent.relname = :table"
+        ), {"table": TABLE}).scalars().all()
+
+        dropped = 0
+        for name in partitions:
+            match = PARTITION_NAME.match(name)
+            if match is None:
+                continue
+
+            day = datetime.datetime.strptime(match.group(1), "%Y%m%d").date()
+            if day + datetime.timedelta(days=1) <= cutoff:
+                connection.execute(text(f"DROP TABLE IF EXISTS {name}"))
+                dropped += 1
+
+    return dropped
+
+
+def maintain_partitions(engine: Engine):
+    try:
+        ensure_partitions(engine)
+        removed = drop_expired_partitions(engine)
+        logger.info(f"Ping log maintenance done, removed {removed} expired partitions/rows")
+
+    except Exception as e:
+        logger.error(f"Ping log maintenance failed: {str(e)}")
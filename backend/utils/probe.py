@@ -0,0 +1,214 @@
+import asyncio
+import datetime
+import os
+import time
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterable, List, Optional
+from urllib.parse import urlparse
+
+import httpx
+from dotenv import load_dotenv
+
+from logger import LOG_FAILURE_SAMPLE_RATE, logger, sampled
+from utils.probe_client import DNSCache, PhaseTimer, create_probe_client
+from utils.urls import normalize_url
+
+load_dotenv()
+
+PROBE_CONCURRENCY = int(os.getenv("PROBE_CONCURRENCY") or 200)
+PROBE_PER_HOST_CONCURRENCY = int(os.getenv("PROBE_PER_HOST_CONCURRENCY") or 4)
+PROBE_CONNECT_TIMEOUT_SECONDS = float(os.getenv("PROBE_CONNECT_TIMEOUT_SECONDS") or 5)
+PROBE_READ_TIMEOUT_SECONDS = float(os.getenv("PROBE_READ_TIMEOUT_SECONDS") or 10)
+PROBE_CONFIRM_RETRIES = int(os.getenv("PROBE_CONFIRM_RETRIES") or 2)
+PROBE_RETRY_BACKOFF_SECONDS = float(os.getenv("PROBE_RETRY_BACKOFF_SECONDS") or 1)
+
+UNREACHABLE_STATUS_CODE = 0  # recorded when no response was received (timeout, refused, DNS failure)
+
+
+def is_failure(status_code: int) -> bool:
+    return not (200 <= status_code < 300)
+
+
+@dataclass
+class ProbeResult:
+    target_id: int
+    status_code: int
+    response_time: int  # in milliseconds
+    checked_at: datetime.datetime
+    # Phases of response_time, in milliseconds; connect/tls are None on a kept-alive connection
+    dns_time: Optional[int] = None
+    connect_time: Optional[int] = None
+    tls_time: Optional[int] = None
+    ttfb_time: Optional[int] = None
+    attempts: int = 1
+    error: Optional[str] = None
+
+    def timings(self) -> Dict[str, Optional[int]]:
+        return {"dns_time": self.dns_time, "connect_time": self.connect_time,
+                "tls_time": self.tls_time, "ttfb_time": self.ttfb_time}
+
+
+@dataclass
+class ProbeGroup:
+    """
+    One probe standing in for every target that monitors the same URL.
+
+    Probed under the id of its first target. It counts as down only when every subscriber
+    already is, so a failure is still confirmed by retries if any subscriber was up.
+    """
+    id: int
+    url: str
+    is_down: bool
+    targets: List
+
+
+def plan_probes(targets: Iterable) -> List[ProbeGroup]:
+    """
+    Group targets by normalized URL so each unique URL is probed once.
+    """
+    groups: Dict[str, ProbeGroup] = {}
+    for target in targets:
+        key = normalize_url(target.url)
+        group = groups.get(key)
+        if group is None:
+            groups[key] = ProbeGroup(id=target.id, url=target.url, is_down=bool(target.is_down), targets=[target])
+        else:
+            group.targets.append(target)
+            group.is_down = group.is_down and bool(target.is_down)
+    return list(groups.values())
+
+
+async def _attempt(client: httpx.AsyncClient, dns_cache: DNSCache, target) -> ProbeResult:
+    timer = PhaseTimer()
+    dns_time = None
+    start_time = time.perf_counter()
+    try:
+        url = httpx.URL(target.url)
+        # Resolved up front so the lookup is timed on its own; the connection then hits the cache
+        await dns_cache.resolve(url.host, url.port or (443 if url.scheme == "https" else 80))
+        dns_time = int((time.perf_counter() - start_time) * 1000)
+        # Pings the URL with a HEAD request
+        response = await client.head(url, extensions={"trace": timer})
+        status_code, error = response.status_code, None
+    except Exception as e:
+        # The reason is only kept here, so failures get their own rate instead of the probe_result sampling
+        logger.warning(f"Probe failed for {target.url}: {str(e) or type(e).__name__}",
+                       extra=sampled("probe_failed", rate=LOG_FAILURE_SAMPLE_RATE, target_id=target.id))
+        status_code, error = UNREACHABLE_STATUS_CODE, str(e) or type(e).__name__
+    response_time = (time.perf_counter() - start_time) * 1000  # Convert to milliseconds
+
+    return ProbeResult(target_id=target.id, status_code=status_code, response_time=int(response_time),
+                       checked_at=datetime.datetime.utcnow(), dns_time=dns_time, error=error, **timer.timings())
+
+
+async def _probe(client: httpx.AsyncClient, dns_cache: DNSCache, target, global_limit: asyncio.Semaphore,
+                 host_limit: asyncio.Semaphore, retries: int, backoff: float, deadline: Optional[float],
+                 on_result: Optional[Callable]) -> ProbeResult:
+    attempt = 0
+    while True:
+        # Take the per-host slot first so targets queued behind a busy host don't hold global slots
+        async with host_limit:
+            async with global_limit:
+                result = await _attempt(client, dns_cache, target)
+        result.attempts = attempt + 1
+
+        # A target that is up is only marked down once the failure is confirmed by retries
+        if not is_failure(result.status_code) or target.is_down or attempt >= retries:
+            break
+
+        delay = backoff * 2 ** attempt
+        # Report the failure unconfirmed rather than have the deadline cancel a retry that would
+        # take as long as this attempt did
+        if deadline is not None and time.monotonic() + delay + result.response_time / 1000 >= deadline:
+            break
+        await asyncio.sleep(delay)  # Slots are released while backing off
+        attempt += 1
+
+    if on_result is not None:
+        on_result(result)
+    return result
+
+
+async def probe_targets(targets: Iterable, client: httpx.AsyncClient, dns_cache: DNSCache,
+                        concurrency: int = PROBE_CONCURRENCY, per_host_concurrency: int = PROBE_PER_HOST_CONCURRENCY,
+                        retries: int = PROBE_CONFIRM_RETRIES, backoff: float = PROBE_RETRY_BACKOFF_SECONDS,
+                        deadline: Optional[float] = None,
+                        on_result: Optional[Callable[[ProbeResult], None]] = None) -> Dict[int, ProbeResult]:
+    """
+    Probe every target concurrently, bounded by a global limit and a per-host limit.
+
+    A failing target that is currently up is retried up to `retries` times with exponential
+    backoff before its failure is reported; a target that cannot be reached at all is reported
+    with UNREACHABLE_STATUS_CODE. Probes still running at `deadline` (a time.monotonic() value)
+    are cancelled.
+
+    `on_result` is called with each result as soon as its probe completes and must not block.
+    Returns a mapping of target id to its result; targets cut off by the deadline are left out.
+    """
+    global_limit = asyncio.Semaphore(concurrency)
+    host_limits = defaultdict(lambda: asyncio.Semaphore(per_host_concurrency))
+
+    tasks = [
+        asyncio.ensure_future(_probe(client, dns_cache, target, global_limit,
+                                     host_limits[urlparse(target.url).hostname or ""],
+                                     retries, backoff, deadline, on_result))
+        for target in targets
+    ]
+    if not tasks:
+        return {}
+
+    timeout = max(deadline - time.monotonic(), 0) if deadline is not None else None
+    done, pending = await asyncio.wait(tasks, timeout=timeout)
+    for task in pending:
+        task.cancel()
+    if pending:
+        await asyncio.wait(pending)
+
+    return {task.result().target_id: task.result() for task in done}
+
+
+class Prober:
+    """
+    Per-process probe engine: one event loop and one HTTP client reused by every run, so
+    connections, DNS answers and TLS sessions carry over between chunks and cycles.
+
+    Created lazily and again after a fork, since neither the loop nor the client survive one.
+    """
+
+    def __init__(self, concurrency: int = PROBE_CONCURRENCY):
+        self.concurrency = concurrency
+        self._pid = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._client: Optional[httpx.AsyncClient] = None
+        self.dns_cache: Optional[DNSCache] = None
+
+    def _ensure_started(self):
+        if self._pid == os.getpid():
+            return
+
+        self._pid = os.getpid()
+        self._loop = asyncio.new_event_loop()
+        self.dns_cache = DNSCache()
+        self._client = create_probe_client(self.concurrency, self.dns_cache, timeout=httpx.Timeout(
+            PROBE_READ_TIMEOUT_SECONDS, connect=PROBE_CONNECT_TIMEOUT_SECONDS, pool=None))
+
+    def run(self, targets: Iterable, **kwargs) -> Dict[int, ProbeResult]:
+        self._ensure_started()
+        kwargs.setdefault("concurrency", self.concurrency)
+        return self._loop.run_until_complete(probe_targets(targets, self._client, self.dns_cache, **kwargs))
+
+    def close(self):
+        if self._pid != os.getpid():
+            return
+
+        self._loop.run_until_complete(self._client.aclose())
+        self._loop.close()
+        self._pid = None
+
+
+prober = Prober()
+
+
+def run_probes(targets: Iterable, **kwargs) -> Dict[int, ProbeResult]:
+    return prober.run(targets, **kwargs)
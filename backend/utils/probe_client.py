@@ -0,0 +1,292 @@
+import asyncio
+import contextlib
+import contextvars
+import ipaddress
+import itertools
+import os
+import socket
+import ssl
+import time
+import typing
+from typing import AsyncIterator, Dict, Iterator, List, Optional, Tuple
+
+import certifi
+import httpcore
+import httpx
+from dotenv import load_dotenv
+
+from utils.ttl_cache import TTLCache
+
+load_dotenv()
+
+PROBE_DNS_TTL_SECONDS = float(os.getenv("PROBE_DNS_TTL_SECONDS") or 300)
+PROBE_KEEPALIVE_SECONDS = float(os.getenv("PROBE_KEEPALIVE_SECONDS") or 60)
+PROBE_TLS_SESSION_TTL_SECONDS = float(os.getenv("PROBE_TLS_SESSION_TTL_SECONDS") or 3600)
+
+CACHE_SIZE = 10000
+
+# Port of the connection whose TLS handshake is starting, for the session cache key
+_tls_port: contextvars.ContextVar[Optional[int]] = contextvars.ContextVar("tls_port", default=None)
+
+
+class DNSCache:
+    """
+    Resolves hostnames once per `ttl` seconds. Concurrent lookups of the same host share one
+    getaddrinfo call; failed lookups are not cached.
+    """
+
+    def __init__(self, ttl: float = PROBE_DNS_TTL_SECONDS, maxsize: int = CACHE_SIZE):
+        self._addresses = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._pending: Dict[Tuple[str, int], asyncio.Future] = {}
+
+    async def resolve(self, host: str, port: int) -> List[str]:
+        """
+        Return every address of the host, alternating address families in getaddrinfo's order
+        so a caller trying them in turn falls back to the other family early.
+        """
+        try:
+            ipaddress.ip_address(host)
+            return [host]
+        except ValueError:
+            pass
+
+        key = (host, port)
+        addresses = self._addresses.get(key)
+        if addresses is not None:
+            return addresses
+
+        pending = self._pending.get(key)
+        if pending is not None:
+            return await asyncio.shield(pending)
+
+        future = asyncio.get_running_loop().create_future()
+        self._pending[key] = future
+        try:
+            infos = await asyncio.get_running_loop().getaddrinfo(host, port, type=socket.SOCK_STREAM)
+            addresses = _interleave_families(infos)
+            self._addresses.set(key, addresses)
+            future.set_result(addresses)
+            return addresses
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()  # Mark as retrieved when nobody else was waiting
+            raise
+        finally:
+            del self._pending[key]
+
+
+def _interleave_families(infos: List[tuple]) -> List[str]:
+    by_family: Dict[int, List[str]] = {}
+    for family, _, _, _, sockaddr in infos:
+        addresses = by_family.setdefault(family, [])
+        if sockaddr[0] not in addresses:
+            addresses.append(sockaddr[0])
+    return [address for group in itertools.zip_longest(*by_family.values()) for address in group
+            if address is not None]
+
+
+class ResumingSSLContext(ssl.SSLContext):
+    """
+    Client SSL context that offers the last TLS session seen for a hostname and port, so
+    reconnecting to a server we probed recently can skip the full handshake. Different ports
+    of one host are often different servers, which would reject each other's sessions.
+    """
+
+    def __init__(self, *args, **kwargs):
+        # SSLContext is set up in __new__, which takes the protocol
+        self.sessions = TTLCache(maxsize=CACHE_SIZE, ttl=PROBE_TLS_SESSION_TTL_SECONDS)
+
+    def wrap_bio(self, incoming, outgoing, server_side=False, server_hostname=None, session=None):
+        # The TLS backend only passes the hostname; the port comes from the stream starting the handshake
+        port = _tls_port.get()
+        if session is None and server_hostname is not None and port is not None:
+            session = self.sessions.get((server_hostname, port))
+        return super().wrap_bio(incoming, outgoing, server_side=server_side,
+                                server_hostname=server_hostname, session=session)
+
+    def remember(self, stream: httpcore.AsyncNetworkStream, port: int):
+        ssl_object = stream.get_extra_info("ssl_object")
+        if ssl_object is not None and ssl_object.session is not None and ssl_object.server_hostname:
+            self.sessions.set((ssl_object.server_hostname, port), ssl_object.session)
+
+
+def create_ssl_context() -> ResumingSSLContext:
+    context = ResumingSSLContext(ssl.PROTOCOL_TLS_CLIENT)
+    context.minimum_version = ssl.TLSVersion.TLSv1_2
+    context.load_verify_locations(cafile=certifi.where())
+    return context
+
+
+class _SessionStream(httpcore.AsyncNetworkStream):
+    """
+    Passes through to the underlying stream and records its TLS session. TLS 1.3 tickets arrive
+    after the handshake, so the session is recorded again when the connection closes.
+    """
+
+    def __init__(self, stream: httpcore.AsyncNetworkStream, ssl_context: ResumingSSLContext, port: int):
+        self._stream = stream
+        self._ssl_context = ssl_context
+        self._port = port
+
+    async def read(self, max_bytes: int, timeout: Optional[float] = None) -> bytes:
+        return await self._stream.read(max_bytes, timeout)
+
+    async def write(self, buffer: bytes, timeout: Optional[float] = None) -> None:
+        await self._stream.write(buffer, timeout)
+
+    async def aclose(self) -> None:
+        self._ssl_context.remember(self._stream, self._port)
+        await self._stream.aclose()
+
+    async def start_tls(self, ssl_context: ssl.SSLContext, server_hostname: Optional[str] = None,
+                        timeout: Optional[float] = None) -> httpcore.AsyncNetworkStream:
+        token = _tls_port.set(self._port)
+        try:
+            stream = await self._stream.start_tls(ssl_context, server_hostname, timeout)
+        finally:
+            _tls_port.reset(token)
+        self._ssl_context.remember(stream, self._port)
+        return _SessionStream(stream, self._ssl_context, self._port)
+
+    def get_extra_info(self, info: str) -> typing.Any:
+        return self._stream.get_extra_info(info)
+
+
+class CachingNetworkBackend(httpcore.AsyncNetworkBackend):
+    """
+    httpcore network backend that connects through the DNS cache and keeps TLS sessions.
+    Resolved addresses are tried in turn, each with an equal share of what is left of the
+    connect timeout. TLS still verifies the certificate against the hostname, not the address.
+    """
+
+    def __init__(self, dns_cache: DNSCache, ssl_context: ResumingSSLContext,
+                 backend: Optional[httpcore.AsyncNetworkBackend] = None):
+        self.dns_cache = dns_cache
+        self.ssl_context = ssl_context
+        self._backend = backend or httpcore.AnyIOBackend()
+
+    async def connect_tcp(self, host: str, port: int, timeout: Optional[float] = None,
+                          local_address: Optional[str] = None,
+                          socket_options: Optional[typing.Iterable] = None) -> httpcore.AsyncNetworkStream:
+        try:
+            addresses = await self.dns_cache.resolve(host, port)
+        except OSError as e:
+            raise httpcore.ConnectError(str(e)) from e
+
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for index, address in enumerate(addresses):
+            attempt_timeout = None if deadline is None else (deadline - time.monotonic()) / (len(addresses) - index)
+            try:
+                stream = await self._backend.connect_tcp(address, port, timeout=attempt_timeout,
+                                                         local_address=local_address, socket_options=socket_options)
+                return _SessionStream(stream, self.ssl_context, port)
+            except (httpcore.ConnectError, httpcore.ConnectTimeout):
+                if index == len(addresses) - 1:
+                    raise
+
+    async def connect_unix_socket(self, path: str, timeout: Optional[float] = None,
+                                  socket_options: Optional[typing.Iterable] = None) -> httpcore.AsyncNetworkStream:
+        return await self._backend.connect_unix_socket(path, timeout=timeout, socket_options=socket_options)
+
+    async def sleep(self, seconds: float) -> None:
+        await self._backend.sleep(seconds)
+
+
+@contextlib.contextmanager
+def _httpx_exceptions() -> Iterator[None]:
+    """
+    Re-raise httpcore errors as the httpx errors of the same name, like httpx's own transport.
+    """
+    try:
+        yield
+    except Exception as e:
+        for cls in type(e).__mro__:
+            mapped = getattr(httpx, cls.__name__, None) if cls.__module__.startswith("httpcore") else None
+            if isinstance(mapped, type) and issubclass(mapped, httpx.TransportError):
+                raise mapped(str(e)) from e
+        raise
+
+
+class _ResponseStream(httpx.AsyncByteStream):
+    def __init__(self, stream: typing.AsyncIterable[bytes]):
+        self._stream = stream
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        with _httpx_exceptions():
+            async for part in self._stream:
+                yield part
+
+    async def aclose(self) -> None:
+        if hasattr(self._stream, "aclose"):
+            await self._stream.aclose()
+
+
+class PoolTransport(httpx.AsyncBaseTransport):
+    """
+    httpx transport over a given httpcore connection pool. httpx.AsyncHTTPTransport builds its
+    pool itself and has no option for a custom network backend, so the probe client uses this.
+    """
+
+    def __init__(self, pool: httpcore.AsyncConnectionPool):
+        self.pool = pool
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        core_request = httpcore.Request(
+            method=request.method,
+            url=httpcore.URL(scheme=request.url.raw_scheme, host=request.url.raw_host, port=request.url.port,
+                             target=request.url.raw_path),
+            headers=request.headers.raw,
+            content=request.stream,
+            extensions=request.extensions,
+        )
+        with _httpx_exceptions():
+            response = await self.pool.handle_async_request(core_request)
+
+        return httpx.Response(status_code=response.status, headers=response.headers,
+                              stream=_ResponseStream(response.stream), extensions=response.extensions)
+
+    async def aclose(self) -> None:
+        await self.pool.aclose()
+
+
+def create_probe_client(max_connections: int, dns_cache: DNSCache, timeout: httpx.Timeout,
+                        keepalive_seconds: float = PROBE_KEEPALIVE_SECONDS) -> httpx.AsyncClient:
+    """
+    Long-lived AsyncClient for probes: keep-alive connections, cached DNS and TLS session resumption.
+    """
+    ssl_context = create_ssl_context()
+    pool = httpcore.AsyncConnectionPool(
+        ssl_context=ssl_context,
+        max_connections=max_connections,
+        max_keepalive_connections=max_connections,
+        keepalive_expiry=keepalive_seconds,
+        network_backend=CachingNetworkBackend(dns_cache, ssl_context),
+    )
+    return httpx.AsyncClient(transport=PoolTransport(pool), timeout=timeout)
+
+
+class PhaseTimer:
+    """
+    httpx trace hook recording when each phase of a request starts and completes.
+
+    connect_time and tls_time are None when the request reused a kept-alive connection.
+    """
+
+    def __init__(self):
+        self.marks: Dict[str, float] = {}
+
+    async def __call__(self, event_name: str, info: Dict):
+        # "connection.connect_tcp.started", "http11.receive_response_headers.complete", ...
+        self.marks[event_name.split(".", 1)[1]] = time.perf_counter()
+
+    def _elapsed(self, start: str, end: str) -> Optional[int]:
+        if start not in self.marks or end not in self.marks:
+            return None
+        return int((self.marks[end] - self.marks[start]) * 1000)
+
+    def timings(self) -> Dict[str, Optional[int]]:
+        return {
+            "connect_time": self._elapsed("connect_tcp.started", "connect_tcp.complete"),
+            "tls_time": self._elapsed("start_tls.started", "start_tls.complete"),
+            "ttfb_time": self._elapsed("send_request_headers.started", "receive_response_headers.complete"),
+        }
@@ -0,0 +1,197 @@
+import datetime
+from collections import defaultdict
+from typing import Dict, Iterable, Tuple
+
+from sqlalchemy import and_, case, delete, func, insert, select, text
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from models import PingLogs, PingRollupDaily, PingRollupHourly
+
+SUCCESS_MAX_RESPONSE_TIME = 30000  # 30 seconds timeout, in milliseconds
+
+
+def is_successful(status_code: int, response_time: int) -> bool:
+    # Successful if status code is 2xx or 3xx and response time is reasonable
+    return 200 <= status_code < 400 and response_time < SUCCESS_MAX_RESPONSE_TIME
+
+
+def success_condition(status_code, response_time):
+    """
+    SQL form of `is_successful` for the given columns.
+    """
+    return and_(status_code >= 200, status_code < 400, response_time < SUCCESS_MAX_RESPONSE_TIME)
+
+
+def hour_bucket(moment: datetime.datetime) -> datetime.datetime:
+    return moment.replace(minute=0, second=0, microsecond=0)
+
+
+def day_bucket(moment: datetime.datetime) -> datetime.datetime:
+    return moment.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def _aggregate(logs: Iterable[Dict], bucket) -> Dict[Tuple[int, datetime.datetime], Dict]:
+    buckets = defaultdict(lambda: {"total_checks": 0, "successful_checks": 0, "response_time_sum": 0,
+                                   "response_time_min": None, "response_time_max": None})
+    for log in logs:
+        rollup = buckets[(log["target_id"], bucket(log["created_at"]))]
+        response_time = log["response_time"]
+        rollup["total_checks"] += 1
+        rollup["successful_checks"] += int(is_successful(log["status_code"], response_time))
+        rollup["response_time_sum"] += response_time
+        rollup["response_time_min"] = response_time if rollup["response_time_min"] is None \
+            else min(rollup["response_time_min"], response_time)
+        rollup["response_time_max"] = response_time if rollup["response_time_max"] is None \
+            else max(rollup["response_time_max"], response_time)
+    return buckets
+
+
+def _merge(db: Session, model, buckets: Dict[Tuple[int, datetime.datetime], Dict]):
+    """
+    Portable fallback for databases without INSERT ... ON CONFLICT: lock and update the existing
+    buckets, insert the missing ones. Two writers creating the same bucket at once would conflict,
+    but every target is written by a single shard, and cycles end before the shortest check
+    interval, so its buckets never are.
+    """
+    keys = sorted(buckets)
+    rows = {(row.target_id, row.bucket_start): row for row in db.execute(
+        select(model)
+        .where(model.target_id.in_({target_id for target_id, _ in keys}),
+               model.bucket_start.in_({bucket_start for _, bucket_start in keys}))
+        .order_by(model.target_id, model.bucket_start)
+        .with_for_update()
+    ).scalars()}
+
+    for key in keys:
+        rollup = buckets[key]
+        row = rows.get(key)
+        if row is None:
+            db.add(model(target_id=key[0], bucket_start=key[1], **rollup))
+            continue
+        row.total_checks += rollup["total_checks"]
+        row.successful_checks += rollup["successful_checks"]
+        row.response_time_sum += rollup["response_time_sum"]
+        row.response_time_min = min(row.response_time_min, rollup["response_time_min"])
+        row.response_time_max = max(row.response_time_max, rollup["response_time_max"])
+    db.flush()
+
+
+def _upsert(db: Session, model, buckets: Dict[Tuple[int, datetime.datetime], Dict]):
+    if not buckets:
+        return
+
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        stmt = postgresql.insert(model)
+        least, greatest = func.least, func.greatest
+    elif dialect == "sqlite":
+        stmt = sqlite.insert(model)
+        least, greatest = func.min, func.max
+    else:
+        _merge(db, model, buckets)
+        return
+
+    table = model.__table__
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[table.c.target_id, table.c.bucket_start],
+        set_={
+            "total_checks": table.c.total_checks + stmt.excluded.total_checks,
+            "successful_checks": table.c.successful_checks + stmt.excluded.successful_checks,
+            "response_time_sum": table.c.response_time_sum + stmt.excluded.response_time_sum,
+            "response_time_min": least(table.c.response_time_min, stmt.excluded.response_time_min),
+            "response_time_max": greatest(table.c.response_time_max, stmt.excluded.response_time_max),
+        }
+    )
+    # Sorted so concurrent writers lock rows in the same order
+    db.execute(stmt, [
+        {"target_id": target_id, "bucket_start": bucket_start, **rollup}
+        for (target_id, bucket_start), rollup in sorted(buckets.items())
+    ])
+
+
+def upsert_rollups(db: Session, logs: Iterable[Dict]):
+    """
+    Add a batch of ping logs (dicts with target_id, status_code, response_time, created_at)
+    to the hourly and daily rollups. Runs in the caller's transaction.
+    """
+    logs = list(logs)
+    _upsert(db, PingRollupHourly, _aggregate(logs, hour_bucket))
+    _upsert(db, PingRollupDaily, _aggregate(logs, day_bucket))
+
+
+def rebuild_rollups(db: Session, start: datetime.datetime, end: datetime.datetime):
+    """
+    Recompute the rollups for [start, end) from the raw ping logs, one hour at a time.
+
+    Used to backfill history that was ingested before the rollup tables existed; the range is
+    widened to whole days so daily buckets are rebuilt completely.
+
+    The PingLogWriter may upsert the same buckets meanwhile. On Postgres both rollup tables are
+    locked against writes until the caller commits, so a concurrent batch is either committed
+    before the rebuild reads the logs or added on top of the rebuilt rows afterwards, never lost
+    or counted twice. SQLite serializes writers already. On other databases run it with the
+    workers stopped or for a range that is no longer written to.
+    """
+    start, end = day_bucket(start), day_bucket(end) + datetime.timedelta(days=1)
+
+    if db.get_bind().dialect.name == "postgresql":
+        # Same order as upsert_rollups takes them, and conflicts with its row-exclusive lock
+        db.execute(text(f"LOCK TABLE {PingRollupHourly.__tablename__}, {PingRollupDaily.__tablename__} "
+                        f"IN SHARE ROW EXCLUSIVE MODE"))
+
+    for model in (PingRollupHourly, PingRollupDaily):
+        db.execute(delete(model).where(model.bucket_start >= start, model.bucket_start < end))
+
+    day = start
+    while day < end:
+        daily = {}
+        for hour in (day + datetime.timedelta(hours=offset) for offset in range(24)):
+            rows = db.query(
+                PingLogs.target_id,
+                func.count(PingLogs.id),
+                func.sum(case((success_condition(PingLogs.status_code, PingLogs.response_time), 1), else_=0)),
+                func.sum(PingLogs.response_time),
+                func.min(PingLogs.response_time),
+                func.max(PingLogs.response_time),
+            ).filter(
+                PingLogs.created_at >= hour,
+                PingLogs.created_at < hour + datetime.timedelta(hours=1)
+            ).group_by(PingLogs.target_id).all()
+
+            hourly = [
+                {"target_id": target_id, "bucket_start": hour, "total_checks": total,
+                 "successful_checks": successful, "response_time_sum": response_sum,
+                 "response_time_min": response_min, "response_time_max": response_max}
+                for target_id, total, successful, response_sum, response_min, response_max in rows
+            ]
+            if hourly:
+                db.execute(insert(PingRollupHourly), hourly)
+
+            for rollup in hourly:
+                current = daily.get(rollup["target_id"])
+                if current is None:
+                    daily[rollup["target_id"]] = {**rollup, "bucket_start": day}
+                    continue
+                current["total_checks"] += rollup["total_checks"]
+                current["successful_checks"] += rollup["successful_checks"]
+                current["response_time_sum"] += rollup["response_time_sum"]
+                current["response_time_min"] = min(current["response_time_min"], rollup["response_time_min"])
+                current["response_time_max"] = max(current["response_time_max"], rollup["response_time_max"])
+
+        if daily:
+            db.execute(insert(PingRollupDaily), list(daily.values()))
+        day += datetime.timedelta(days=1)
+
+
+if __name__ == "__main__":
+    from db import SessionLocal
+
+    # Backfill the last 30 days of rollups from the raw ping logs
+    session = SessionLocal()
+    try:
+        now = datetime.datetime.utcnow()
+        rebuild_rollups(session, now - datetime.timedelta(days=30), now)
+        session.commit()
+    finally:
+        session.close()
@@ -1,20 +1,134 @@
 import datetime
+import itertools
+import os
+import random
+import threading
+import time
+from typing import Dict, Iterable, List, Tuple
 
 from apscheduler.schedulers.background import BackgroundScheduler
+from dotenv import load_dotenv
 
-from utils.celery_worker import monitor_endpoint
+from db import SessionLocal, engine
+from logger import logger
+from models import PingTarget
+from utils.celery_worker import monitor_endpoint, shard_key, sweep_alerts
+from utils.partitions import maintain_partitions
+from utils.timing_wheel import HashedTimingWheel, next_slot_time
+
+load_dotenv()
+
+SCHEDULER_TICK_SECONDS = float(os.getenv("SCHEDULER_TICK_SECONDS") or 1)
+SCHEDULER_SYNC_SECONDS = float(os.getenv("SCHEDULER_SYNC_SECONDS") or 60)
+ALERT_SWEEP_SECONDS = float(os.getenv("ALERT_SWEEP_SECONDS") or 60)
 
 scheduler = BackgroundScheduler()
 
 
+class DueScheduler:
+    """
+    Tracks the next check of every active target on a hashed timing wheel.
+
+    Each target is checked on a fixed grid: multiples of its interval shifted by a stable
+    hash of its shard key, so load is spread evenly over the interval and per-target spacing
+    is the same across restarts. The shard key is the URL hash, which puts targets sharing a
+    URL and an interval on the same tick so their probe can be shared. Jitter is applied on top
+    of the grid and never accumulates. Wheel items carry a generation so removed or re-added
+    targets drop stale entries lazily.
+    """
+
+    def __init__(self, tick_seconds: float = SCHEDULER_TICK_SECONDS):
+        self._wheel = HashedTimingWheel(tick_seconds=tick_seconds)
+        self._targets: Dict[int, Tuple[int, int, int, int]] = {}  # target_id -> (interval, jitter, generation, key)
+        self._generations = itertools.count()
+        self._lock = threading.Lock()
+        self._synced = False
+
+    def __len__(self):
+        return len(self._targets)
+
+    def _schedule(self, target_id: int, nominal: float, jitter: int, generation: int):
+        due_at = nominal + random.uniform(0, jitter) if jitter else nominal
+        self._wheel.schedule((nominal, generation, target_id), due_at)
+
+    def sync(self, rows: Iterable[Tuple[int, int, int, int]], now: float):
+        """
+        Reconcile with the active targets given as (id, interval_seconds, jitter_seconds, shard key) rows.
+        """
+        with self._lock:
+            targets = {}
+            for target_id, interval, jitter, key in rows:
+                current = self._targets.get(target_id)
+                if current is not None and current[0] == interval and current[3] == key:
+                    targets[target_id] = (interval, jitter, current[2], key)
+                    continue
+
+                generation = next(self._generations)
+                targets[target_id] = (interval, jitter, generation, key)
+                if self._synced and current is None:
+                    # Targets added while running get their first check right away
+                    self._schedule(target_id, now, 0, generation)
+                else:
+                    self._schedule(target_id, next_slot_time(key, interval, now), jitter, generation)
+
+            self._targets = targets
+            self._synced = True
+
+    def pop_due(self, now: float) -> List[Tuple[int, int]]:
+        """
+        Return (id, shard key) of the targets due at `now`, rescheduling each one on its grid.
+        """
+        due = []
+        with self._lock:
+            for nominal, generation, target_id in self._wheel.advance(now):
+                target = self._targets.get(target_id)
+                if target is None or target[2] != generation:
+                    continue
+
+                interval, jitter, _, key = target
+                due.append((target_id, key))
+                self._schedule(target_id, next_slot_time(key, interval, max(nominal, now)), jitter, generation)
+
+        return due
+
+
+due_scheduler = DueScheduler()
+
+
+def sync_targets():
+    db = SessionLocal()
+    try:
+        rows = db.query(PingTarget.id, PingTarget.interval_seconds, PingTarget.jitter_seconds,
+                        shard_key(PingTarget)).filter(
+            PingTarget.is_active == True
+        ).all()
+        due_scheduler.sync(rows, time.time())
+
+    except Exception as e:
+        logger.error(f"Failed to sync scheduled targets: {str(e)}")
+
+    finally:
+        db.close()
+
+
 def run_process():
     try:
-        print(f"Running process at {datetime.datetime.now()}")
-        result = monitor_endpoint.delay()
-        print(f"Task submitted: {result.id}")
+        due = due_scheduler.pop_due(time.time())
+        if not due:
+            return
+
+        target_ids, shard_keys = map(list, zip(*due))
+        result = monitor_endpoint.delay(target_ids, shard_keys, enqueued_at=time.time())
+        logger.info(f"Submitted task {result.id} for {len(due)} due targets")
 
     except Exception as e:
-        print(f"❌ ERROR: {str(e)}")
+        logger.error(f"Failed to dispatch due targets: {str(e)}")
 
 
-scheduler.add_job(run_process, 'cron', minute='*/15')  # Runs every 15 minutes
+scheduler.add_job(sync_targets, 'interval', seconds=SCHEDULER_SYNC_SECONDS,
+                  next_run_time=datetime.datetime.now(), max_instances=1, coalesce=True)
+scheduler.add_job(run_process, 'interval', seconds=SCHEDULER_TICK_SECONDS,
+                  max_instances=1, coalesce=True)  # Dispatches targets as they become due
+scheduler.add_job(sweep_alerts, 'interval', seconds=ALERT_SWEEP_SECONDS,
+                  max_instances=1, coalesce=True)  # Flushes alerts stranded by a lost flush task
+scheduler.add_job(maintain_partitions, 'cron', hour=0, minute=5, args=[engine])  # Rolls ping_logs partitions daily
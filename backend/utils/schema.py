@@ -0,0 +1,183 @@
+import datetime
+
+from sqlalchemy import Table, inspect, text
+from sqlalchemy.engine import Connection, Engine
+
+from logger import logger
+from models import Base, PingLogs
+from utils.partitions import PING_LOG_PARTITIONS_AHEAD, PING_LOG_RETENTION_DAYS, create_partitions, is_partitioned
+from utils.urls import url_hash
+
+# Columns added to tables that existing deployments already have: table -> [(column, DDL)]
+ADDED_COLUMNS = {
+    "ping_targets": [
+        ("interval_seconds", "INTEGER NOT NULL DEFAULT 900"),
+        ("jitter_seconds", "INTEGER NOT NULL DEFAULT 0"),
+        ("url_hash", "BIGINT"),
+    ],
+    "emails_sent": [
+        ("template_id", "VARCHAR(50)"),
+        ("params", "JSON"),
+        ("digest_id", "VARCHAR(32)"),
+    ],
+    # On Postgres ping_logs is partitioned; columns added to the parent are added to every partition
+    "ping_logs": [
+        ("dns_time", "INTEGER"),
+        ("connect_time", "INTEGER"),
+        ("tls_time", "INTEGER"),
+        ("ttfb_time", "INTEGER"),
+    ],
+}
+
+# Indexes added to existing tables since they were created, as declared on the models
+ADDED_INDEXES = {
+    "ping_targets": ["ix_ping_targets_url_hash"],
+    "emails_sent": ["ix_emails_sent_user_id_created_at", "ix_emails_sent_digest_id"],
+    "ping_logs": ["ix_ping_logs_target_id_created_at"],
+}
+
+# Columns that were NOT NULL when created and are nullable now: table -> [column]
+NULLABLE_COLUMNS = {
+    "emails_sent": ["body"],
+}
+
+
+def _add_columns(connection: Connection):
+    inspector = inspect(connection)
+    # Postgres can skip a column another process added concurrently; SQLite relies on the inspection
+    if_not_exists = "IF NOT EXISTS " if connection.dialect.name == "postgresql" else ""
+
+    for table, columns in ADDED_COLUMNS.items():
+        existing = {column["name"] for column in inspector.get_columns(table)}
+        for name, ddl in columns:
+            if name in existing:
+                continue
+            connection.execute(text(f"ALTER TABLE {table} ADD COLUMN {if_not_exists}{name} {ddl}"))
+            logger.info(f"Added column {table}.{name}")
+
+
+def _rebuild_sqlite_table(connection: Connection, table: Table):
+    """
+    SQLite cannot change a column's constraints in place: recreate the table from the model
+    and copy the rows of every column both versions have.
+    """
+    inspector = inspect(connection)
+    old_name = f"{table.name}_old"
+    # Index names are global in SQLite, so the old ones would clash with the new table's
+    for index in inspector.get_indexes(table.name):
+        connection.execute(text(f"DROP INDEX {index['name']}"))
+    columns = ", ".join(column["name"] for column in inspector.get_columns(table.name) if column["name"] in table.c)
+
+    connection.execute(text(f"ALTER TABLE {table.name} RENAME TO {old_name}"))
+    table.create(connection)
+    connection.execute(text(f"INSERT INTO {table.name} ({columns}) SELECT {columns} FROM {old_name}"))
+    connection.execute(text(f"DROP TABLE {old_name}"))
+
+
+def _drop_not_null(connection: Connection):
+    inspector = inspect(connection)
+
+    for table, names in NULLABLE_COLUMNS.items():
+        required = [column["name"] for column in inspector.get_columns(table)
+                    if column["name"] in names and not column["nullable"]]
+        if not required:
+            continue
+
+        if connection.dialect.name == "sqlite":
+            _rebuild_sqlite_table(connection, Base.metadata.tables[table])
+        else:
+            for name in required:
+                connection.execute(text(f"ALTER TABLE {table} ALTER COLUMN {name} DROP NOT NULL"))
+        logger.info(f"Made {table}.{', '.join(required)} nullable")
+
+
+def _partition_ping_logs(connection: Connection):
+    """
+    One-time conversion of a ping_logs table created before it was partitioned: the plain table
+    is renamed, the partitioned table is created in its place with daily partitions covering
+    the retention window, rows within retention are copied over and the old table is dropped.
+
+    Runs under an ACCESS EXCLUSIVE lock and rewrites every kept row, so the first start after
+    upgrading takes as long as the copy; nothing can write ping logs meanwhile. Rows older than
+    PING_LOG_RETENTION_DAYS are not copied, pruning would drop them anyway.
+    """
+    table = PingLogs.__table__
+    if connection.dialect.name != "postgresql" or not inspect(connection).has_table(table.name):
+        return
+
+    connection.execute(text(f"LOCK TABLE {table.name} IN ACCESS EXCLUSIVE MODE"))
+    if is_partitioned(connection):
+        return
+
+    old_name = f"{table.name}_unpartitioned"
+    # Free the names the partitioned table is created with: its indexes, primary key and id sequence
+    indexes = connection.execute(text(
+        "SELECT indexname FROM pg_indexes WHERE schemaname = current_schema() AND tablename = :table"
+    ), {"table": table.name}).scalars().all()
+    for index in indexes:
+        connection.execute(text(f"ALTER INDEX {index} RENAME TO {index}_unpartitioned"))
+    sequence = connection.execute(text("SELECT pg_get_serial_sequence(:table, 'id')"), {"table": table.name}).scalar()
+    connection.execute(text(f"ALTER TABLE {table.name} RENAME TO {old_name}"))
+    if sequence is not None:
+        connection.execute(text(f"ALTER SEQUENCE {sequence} RENAME TO {old_name}_id_seq"))
+
+    table.create(connection)
+
+    today = datetime.datetime.utcnow().date()
+    cutoff = today - datetime.timedelta(days=PING_LOG_RETENTION_DAYS)
+    oldest = connection.execute(text(f"SELECT MIN(created_at) FROM {old_name} WHERE created_at >= :cutoff"),
+                                {"cutoff": cutoff}).scalar()
+    create_partitions(connection, max(cutoff, oldest.date()) if oldest else today,
+                      today + datetime.timedelta(days=PING_LOG_PARTITIONS_AHEAD))
+
+    columns = ", ".join(column["name"] for column in inspect(connection).get_columns(old_name)
+                        if column["name"] in table.c)
+    copied = connection.execute(text(
+        f"INSERT INTO {table.name} ({columns}) SELECT {columns} FROM {old_name} WHERE created_at >= :cutoff"
+    ), {"cutoff": cutoff}).rowcount
+    connection.execute(text(
+        f"SELECT setval(pg_get_serial_sequence(:table, 'id'), COALESCE(MAX(id), 0) + 1, false) FROM {table.name}"
+    ), {"table": table.name})
+    connection.execute(text(f"DROP TABLE {old_name}"))
+    logger.info(f"Converted {table.name} to a partitioned table, copied {copied} rows")
+
+
+def _create_indexes(connection: Connection):
+    for table, names in ADDED_INDEXES.items():
+        for index in Base.metadata.tables[table].indexes:
+            if index.name in names:
+                index.create(connection, checkfirst=True)
+
+
+def _backfill_url_hashes(connection: Connection, batch_size: int = 1000):
+    """
+    Hash the URLs of targets created before url_hash existed, in batches of `batch_size` rows.
+    """
+    last_id, filled = 0, 0
+    while True:
+        rows = connection.execute(text(
+            "SELECT id, url FROM ping_targets WHERE url_hash IS NULL AND id > :last_id ORDER BY id LIMIT :limit"
+        ), {"last_id": last_id, "limit": batch_size}).all()
+        if not rows:
+            break
+
+        connection.execute(text("UPDATE ping_targets SET url_hash = :url_hash WHERE id = :id"),
+                           [{"id": row.id, "url_hash": url_hash(row.url)} for row in rows])
+        last_id, filled = rows[-1].id, filled + len(rows)
+
+    if filled:
+        logger.info(f"Backfilled url_hash for {filled} targets")
+
+
+def upgrade_schema(engine: Engine):
+    """
+    Bring tables created by an earlier version up to date. create_all only creates missing
+    tables and never alters existing ones, so columns added or relaxed since are changed here.
+    Every step is idempotent; runs at startup right after create_all.
+    """
+    with engine.begin() as connection:
+        _add_columns(connection)
+        _drop_not_null(connection)
+        _partition_ping_logs(connection)
+        _create_indexes(connection)
+        _backfill_url_hashes(connection)
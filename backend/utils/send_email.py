@@ -1,62 +1,144 @@
+import hashlib
+import json
 import os
-from datetime import datetime
+import uuid
+from collections import defaultdict
+from typing import Dict, List, Optional
 
-import resend
+import httpx
 from dotenv import load_dotenv
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
 
-from db import db_dependency
 from models import EmailsSent
-from utils.email_format import subject, html
-
-from utils.dynamic_content import dynamic_content
+from utils.dynamic_content import render, render_many
 
 load_dotenv()
 
-resend.api_key = os.getenv("RESEND_API_KEY")
+RESEND_API_KEY = os.getenv("RESEND_API_KEY")
+RESEND_API_URL = os.getenv("RESEND_API_URL") or "https://api.resend.com"
+EMAIL_FROM = "Md Sohail Ansari <no-reply@contact.heysohail.xyz>"
+EMAIL_BATCH_SIZE = 100  # Resend accepts at most 100 emails per batch call
 
+_client: Optional[httpx.Client] = None
 
-def send_mail(user_id: str, target_id: int, email: str, endpoint_name, user_name: str, endpoint_url: str,
-              timestamp: datetime, status_code: int, db: db_dependency):
-    try:
 
-        subject_values = {
-            "endpoint_name": endpoint_name
-        }
-        email_subject = dynamic_content(content=subject, values=subject_values)
-
-        html_values = {
-            "user_name": user_name,
-            "endpoint_url": endpoint_url,
-            "timestamp": timestamp,
-            "status_code": status_code
-        }
-        email_html = dynamic_content(content=html, values=html_values)
-
-        params: resend.Emails.SendParams = {
-            "from": "Md Sohail Ansari <no-reply@contact.heysohail.xyz>",
-            "to": [email],
-            "subject": email_subject,
-            "html": email_html,
-        }
-
-        email_send: resend.Email = resend.Emails.send(params)
-        print(email_send)
-
-        db_email = EmailsSent(
-            user_id=user_id,
-            target_id=target_id,
-            subject=email_subject,
-            body=email_html
+class EmailSendError(Exception):
+    """Raised when the provider failed in a way that is worth retrying (network errors, 429, 5xx)."""
+
+
+def get_client() -> httpx.Client:
+    """
+    Long-lived client per worker process, so provider calls reuse pooled keep-alive connections.
+    """
+    global _client
+    if _client is None:
+        _client = httpx.Client(
+            base_url=RESEND_API_URL,
+            headers={"Authorization": f"Bearer {RESEND_API_KEY}"},
+            timeout=httpx.Timeout(10.0, connect=5.0),
+            limits=httpx.Limits(max_connections=10, max_keepalive_connections=10),
         )
-        db.add(db_email)
-    except Exception as e:
-        print(f"❌ ERROR: {str(e)}")
-
-# send_mail(
-#     email="sohailatwork10@gmail.com",
-#     endpoint_name="User Login API",
-#     user_name="Sohail",
-#     endpoint_url="https://api.zapmail.in/v1/auth/login",
-#     timestamp="2025-06-01 10:45:23",
-#     status_code="200 OK"
-# )
+    return _client
+
+
+def render_digests(alerts: List[Dict]) -> List[Dict]:
+    """
+    Group alerts per user and render one email for each user.
+
+    Each alert holds user_id, target_id, email, user_name, endpoint_name, endpoint_url,
+    timestamp and status_code. A user with a single alert gets the regular alert email,
+    a user with several gets one digest listing every target that went down.
+    """
+    alerts_by_user = defaultdict(list)
+    for alert in alerts:
+        alerts_by_user[alert["user_id"]].append(alert)
+
+    singles = [user_alerts for user_alerts in alerts_by_user.values() if len(user_alerts) == 1]
+    digests = [user_alerts for user_alerts in alerts_by_user.values() if len(user_alerts) > 1]
+
+    # Each template renders its whole batch in one call
+    subjects = render_many("alert_subject", [{"endpoint_name": alerts[0]["endpoint_name"]} for alerts in singles])
+    htmls = render_many("alert_html", [{
+        "user_name": alerts[0]["user_name"],
+        "endpoint_url": alerts[0]["endpoint_url"],
+        "timestamp": alerts[0]["timestamp"],
+        "status_code": alerts[0]["status_code"]
+    } for alerts in singles])
+    subjects += render_many("digest_subject", [{"alerts": alerts} for alerts in digests])
+    htmls += render_many("digest_html", [{"user_name": alerts[0]["user_name"], "alerts": alerts} for alerts in digests])
+
+    return [{
+        "user_id": user_alerts[0]["user_id"],
+        "email": user_alerts[0]["email"],
+        "subject": subject,
+        "html": html,
+        "alerts": user_alerts,
+    } for user_alerts, subject, html in zip(singles + digests, subjects, htmls)]
+
+
+def send_batch(messages: List[Dict]):
+    """
+    Send up to EMAIL_BATCH_SIZE rendered messages with one provider call.
+
+    The idempotency key is derived from the batch contents, so a retry after a lost response
+    does not deliver the same emails twice.
+    """
+    payload = [{
+        "from": EMAIL_FROM,
+        "to": [message["email"]],
+        "subject": message["subject"],
+        "html": message["html"],
+    } for message in messages]
+    idempotency_key = hashlib.sha256(json.dumps(
+        [[alert["target_id"], message["email"], alert["timestamp"]] for message in messages for alert in message["alerts"]]
+    ).encode()).hexdigest()
+
+    try:
+        response = get_client().post("/emails/batch", json=payload, headers={"Idempotency-Key": idempotency_key})
+    except httpx.HTTPError as e:
+        raise EmailSendError(str(e)) from e
+
+    if response.status_code == 429 or response.status_code >= 500:
+        raise EmailSendError(f"Provider returned {response.status_code}: {response.text}")
+    response.raise_for_status()
+
+
+def record_sent(db: Session, messages: List[Dict]):
+    """
+    Record one row per alerted target in a single insert.
+
+    Rows keep the template id and their alert's values instead of the rendered HTML. The rows
+    of a digest share a digest id, so the digest can be rebuilt from them by render_sent.
+    """
+    rows = []
+    for message in messages:
+        is_digest = len(message["alerts"]) > 1
+        digest_id = uuid.uuid4().hex if is_digest else None
+        rows.extend({
+            "user_id": message["user_id"],
+            "target_id": alert["target_id"],
+            "subject": message["subject"],
+            "template_id": "digest_html" if is_digest else "alert_html",
+            "digest_id": digest_id,
+            "params": {
+                "user_name": alert["user_name"],
+                "endpoint_name": alert["endpoint_name"],
+                "endpoint_url": alert["endpoint_url"],
+                "timestamp": alert["timestamp"],
+                "status_code": alert["status_code"]
+            },
+        } for alert in message["alerts"])
+
+    if rows:
+        db.execute(insert(EmailsSent), rows)
+
+
+def render_sent(template_id: str, params: List[Dict]) -> str:
+    """
+    Render a recorded email again from the params of its rows, in insert order: a single row
+    for an alert, every row sharing the digest id for a digest.
+    """
+    if template_id == "digest_html":
+        return render(template_id, {"user_name": params[0]["user_name"], "alerts": params})
+    return render(template_id, params[0])
@@ -0,0 +1,81 @@
+import math
+import zlib
+from typing import Any, List, Tuple
+
+
+def stable_offset(key: int, interval: int) -> int:
+    """
+    Offset in seconds of a target inside its interval, derived from a stable hash of its key.
+
+    crc32 is used instead of hash() so the offset is the same in every process and after restarts.
+    """
+    return zlib.crc32(str(key).encode()) % interval
+
+
+def next_slot_time(key: int, interval: int, now: float) -> float:
+    """
+    First time after `now` on the target's grid: epoch-aligned multiples of the interval shifted by its offset.
+    """
+    offset = stable_offset(key, interval)
+    return (math.floor((now - offset) / interval) + 1) * interval + offset
+
+
+class HashedTimingWheel:
+    """
+    Hashed timing wheel: items are hashed into `slot_count` buckets by their due tick.
+
+    Scheduling is O(1) and advancing the wheel only touches the buckets whose ticks
+    elapsed. Items due further out than one rotation share a bucket with nearer ones
+    and are kept until their own tick comes round.
+    """
+
+    def __init__(self, tick_seconds: float = 1.0, slot_count: int = 3600):
+        self.tick_seconds = tick_seconds
+        self._slots: List[List[Tuple[int, Any]]] = [[] for _ in range(slot_count)]
+        self._cursor = None  # last tick that was processed
+        self._first_tick = None  # earliest tick scheduled before the wheel first advanced
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def schedule(self, item: Any, due: float):
+        due_tick = math.ceil(due / self.tick_seconds)
+        if self._cursor is None:
+            self._first_tick = due_tick if self._first_tick is None else min(self._first_tick, due_tick)
+        elif due_tick <= self._cursor:
+            due_tick = self._cursor + 1
+
+        self._slots[due_tick % len(self._slots)].append((due_tick, item))
+        self._size += 1
+
+    def advance(self, now: float) -> List[Any]:
+        """
+        Move the wheel up to `now` and return every item whose due time has passed.
+        """
+        now_tick = math.floor(now / self.tick_seconds)
+        if self._cursor is None:
+            self._cursor = min(now_tick, self._first_tick if self._first_tick is not None else now_tick) - 1
+        if now_tick <= self._cursor:
+            return []
+
+        slot_count = len(self._slots)
+        expired = []
+        # A full rotation visits every bucket, so a long pause never needs more than that
+        for tick in range(max(self._cursor + 1, now_tick - slot_count + 1), now_tick + 1):
+            index = tick % slot_count
+            slot = self._slots[index]
+            if not slot:
+                continue
+
+            pending = []
+            for due_tick, item in slot:
+                if due_tick <= now_tick:
+                    expired.append(item)
+                else:
+                    pending.append((due_tick, item))
+            self._slots[index] = pending
+
+        self._cursor = now_tick
+        self._size -= len(expired)
+        return expired
@@ -0,0 +1,36 @@
+import zlib
+from urllib.parse import urlsplit, urlunsplit
+
+DEFAULT_PORTS = {"http": 80, "https": 443}
+
+
+def normalize_url(url: str) -> str:
+    """
+    Canonical form of a URL for deciding whether two targets probe the same thing: lowercase
+    scheme and host, no default port, "/" for an empty path and no fragment. The query is kept.
+    """
+    try:
+        parts = urlsplit(url.strip())
+        port = parts.port
+    except ValueError:
+        return url
+
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").lower()
+    if ":" in host:
+        host = f"[{host}]"  # IPv6 literal
+
+    netloc = host if port is None or DEFAULT_PORTS.get(scheme) == port else f"{host}:{port}"
+    if parts.username is not None:
+        userinfo = parts.username if parts.password is None else f"{parts.username}:{parts.password}"
+        netloc = f"{userinfo}@{netloc}"
+
+    return urlunsplit((scheme, netloc, parts.path or "/", parts.query, ""))
+
+
+def url_hash(url: str) -> int:
+    """
+    Stable hash of the normalized URL. Targets with the same URL share it, which puts them
+    in the same monitor shard and on the same schedule phase.
+    """
+    return zlib.crc32(normalize_url(url).encode())